@@ -22,6 +22,8 @@ class Parameters:
     tls: Optional[bool] = attr.ib(default=None)
     replica: Optional[int] = attr.ib(default=None)
     quota: Optional[int] = attr.ib(default=None)
+    processes: Optional[int] = attr.ib(default=None)
+    inflight: Optional[int] = attr.ib(default=None)
 
 
 class SchemaLoad(object):
@@ -4,6 +4,7 @@
 import os
 import logging
 import asyncio
+import collections
 from cbcmgr.exceptions import TaskError
 from cbcmgr.cb_session import BucketMode
 from cbcmgr.cb_operation_a import CBOperationAsync, Operation
@@ -26,9 +27,12 @@ class CBPoolAsync(object):
                  quota: int = 256,
                  replicas: int = 0,
                  mode: BucketMode = BucketMode.DEFAULT,
-                 throttle: bool = False):
+                 throttle: bool = False,
+                 max_tasks: int = None,
+                 stream: bool = False):
         self.keyspace = {}
         self.tasks = set()
+        self.errors = []
         self.loop = asyncio.get_event_loop()
         self.hostname = hostname
         self.username = username
@@ -41,10 +45,13 @@ class CBPoolAsync(object):
         self.quota = quota
         self.replicas = replicas
         self.mode = mode
-        self.max_tasks = max(32, os.cpu_count() * 2)
-        self.factor = 0.01
         self.throttle = throttle
-        self.retry_number = 0
+        self.max_tasks = max_tasks if max_tasks else max(32, os.cpu_count() * 2) if throttle else 1024
+        self.stream = stream
+        self.semaphore = None
+        self.changed = None
+        self.closed = False
+        self.results = collections.deque()
 
     async def connect(self, keyspace):
         if keyspace in self.keyspace:
@@ -63,30 +70,64 @@ class CBPoolAsync(object):
         opm = await opc.init()
         self.keyspace[keyspace] = await opm.connect(keyspace)
 
-    async def dispatch(self, keyspace: str, op: Operation, *args):
-        if self.throttle and len(asyncio.all_tasks()) > (self.max_tasks * 1.1):
-            self.retry_number += 1
-            wait = self.factor
-            wait *= (2 ** self.retry_number)
-            await asyncio.sleep(wait)
-        elif self.throttle and len(asyncio.all_tasks()) > self.max_tasks:
-            wait = self.factor
-            wait *= (2 ** self.retry_number)
-            await asyncio.sleep(wait)
+    def prepare(self):
+        if not self.semaphore:
+            self.semaphore = asyncio.Semaphore(self.max_tasks)
+            self.changed = asyncio.Event()
+
+    def task_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if task.cancelled() or task.exception():
+            if not task.cancelled():
+                self.errors.append(task.exception())
+            self.semaphore.release()
+        elif self.stream:
+            self.results.append(task.result())
         else:
-            self.retry_number = 0
+            self.semaphore.release()
+        self.changed.set()
+
+    def check(self):
+        if self.errors:
+            errors, self.errors = self.errors, []
+            raise TaskError(f"task error: {errors[0]}")
+
+    async def dispatch(self, keyspace: str, op: Operation, *args):
+        self.prepare()
+        self.check()
+        await self.semaphore.acquire()
         opm = self.keyspace[keyspace]
         operator = opm.get_operator(op)
         operator.prep(*args)
-        self.tasks.add(self.loop.create_task(operator.execute()))
+        task = self.loop.create_task(operator.execute())
+        self.tasks.add(task)
+        task.add_done_callback(self.task_done)
+
+    def close(self):
+        self.closed = True
+        if self.changed:
+            self.changed.set()
+
+    async def as_completed(self, follow: bool = False):
+        if not self.stream:
+            raise ValueError("pool was not created with stream enabled")
+        self.prepare()
+        while True:
+            self.check()
+            if self.results:
+                result = self.results.popleft()
+                self.semaphore.release()
+                yield result
+                continue
+            if not self.tasks and (self.closed or not follow):
+                break
+            self.changed.clear()
+            await self.changed.wait()
 
     async def join(self):
-        if len(self.tasks) > 0:
-            await asyncio.sleep(1)
-            results = await asyncio.gather(*self.tasks, return_exceptions=True)
-            for result in results:
-                if isinstance(result, Exception):
-                    raise TaskError(f"task error: {result}")
+        if self.tasks:
+            await asyncio.wait(set(self.tasks))
+        self.check()
 
     async def shutdown(self):
         for opm in self.keyspace.values():
@@ -0,0 +1,69 @@
+##
+##
+
+import math
+import asyncio
+import logging
+import concurrent.futures
+from itertools import chain
+from typing import Awaitable, Callable, Iterator, List, Tuple
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from cbcmgr.exceptions import PaginationDataNotFound
+
+logger = logging.getLogger('cbutil.capella.pager')
+logger.addHandler(logging.NullHandler())
+MAX_PAGE_SIZE = 100
+
+
+def page_cursor(response_json) -> Tuple[list, dict]:
+    try:
+        return response_json['data'], response_json['cursor']['pages']
+    except (KeyError, TypeError):
+        raise PaginationDataNotFound("pagination values not found")
+
+
+def page_url(url: str, page: int, per_page: int) -> str:
+    parts = urlparse(url)
+    query = dict(parse_qsl(parts.query))
+    query.update(page=page, perPage=per_page)
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+class CapellaPager(object):
+
+    def __init__(self, url: str, response_json: dict, page_size: int = MAX_PAGE_SIZE, concurrency: int = 8):
+        self.url = url
+        self.concurrency = concurrency
+        data, pages = page_cursor(response_json)
+        self.first = data
+        self.per_page = pages.get('perPage') or len(data) or page_size
+        self.pages = []
+
+        if not pages.get('next'):
+            return
+
+        total_items = pages.get('totalItems')
+        if total_items is None:
+            raise PaginationDataNotFound("pagination total not found")
+        if self.per_page >= page_size:
+            self.pages = list(range(pages.get('page', 1) + 1, math.ceil(total_items / self.per_page) + 1))
+        else:
+            self.first = []
+            self.per_page = page_size
+            self.pages = list(range(1, math.ceil(total_items / page_size) + 1))
+        logger.debug(f"{url}: {total_items} item(s) in {len(self.pages)} more page(s) of {self.per_page}")
+
+    def page_urls(self) -> List[str]:
+        return [page_url(self.url, page, self.per_page) for page in self.pages]
+
+    def items(self, get: Callable[[str], dict]) -> Iterator:
+        yield from self.first
+        if not self.pages:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.concurrency, len(self.pages))) as executor:
+            for response_json in executor.map(get, self.page_urls()):
+                yield from page_cursor(response_json)[0]
+
+    async def items_a(self, get: Callable[[str], Awaitable[dict]]) -> Iterator:
+        results = await asyncio.gather(*[get(url) for url in self.page_urls()])
+        return chain(self.first, *(page_cursor(response_json)[0] for response_json in results))
@@ -4,8 +4,9 @@
 from __future__ import annotations
 from .exceptions import (CollectionNameNotFound, IndexExistsError, QueryArgumentsError, QueryEmptyException, ClusterNotConnected, BucketNotConnected, ScopeWaitException,
                          ScopeNotConnected, CollectionSubdocUpsertError, BucketWaitException, BucketStatsError, CollectionCountException, CollectionCountError)
-from .retry import retry, retry_inline
+from .retry import retry, retry_inline, retry_multi
 from .cb_session import CBSession
+from .cb_connect_lite import CBConnectLite, BulkResult
 from .httpsessionmgr import APISession
 from datetime import timedelta
 from typing import Union, Dict, Any, List
@@ -167,6 +168,31 @@ class CBConnect(CBSession):
         except DocumentExistsException:
             return None
 
+    def get_docs(self, keys: List[Union[int, str]]) -> BulkResult:
+        key_map = {self.construct_key(key): key for key in keys}
+        results, errors = retry_multi(self._collection.get_multi, list(key_map), no_retry_list=(DocumentNotFoundException,))
+        logger.debug(f"get_docs: {len(results)} read(s) {len(errors)} error(s)")
+        return BulkResult({key_map[key]: result.content_as[dict] for key, result in results.items()},
+                          {key_map[key]: err for key, err in errors.items()})
+
+    def put_docs(self, documents: Dict[Union[int, str], JSONType], safe: bool = False) -> BulkResult:
+        key_map = {self.construct_key(key): key for key in documents}
+        operation = self._collection.insert_multi if safe else self._collection.upsert_multi
+        results, errors = retry_multi(operation, {key: documents[source] for key, source in key_map.items()}, no_retry_list=(DocumentExistsException,))
+        logger.debug(f"put_docs: {len(results)} write(s) {len(errors)} error(s)")
+        return BulkResult({key_map[key]: result.cas for key, result in results.items()},
+                          {key_map[key]: err for key, err in errors.items()})
+
+    def cb_scan(self, start: str = None, end: str = None, ids_only: bool = False, concurrency: int = 16):
+        return CBConnectLite.scan_range(self._collection, start, end, ids_only=ids_only, concurrency=concurrency)
+
+    @retry()
+    def cb_key_ranges(self, partitions: int, sample_size: int = 100):
+        if partitions <= 1:
+            return [(None, None)]
+        keys = CBConnectLite.sample_keys(self._collection, partitions * sample_size)
+        return CBConnectLite.key_ranges(keys, partitions)
+
     @retry()
     def cb_subdoc_upsert(self, key: Union[int, str], field: str, value: JSONType):
         document_id = self.construct_key(key)
@@ -1,9 +1,9 @@
 ##
 ##
 
-import attrs
+import attr
 from .exceptions import (IndexInternalError, CollectionGetError, CollectionCountError, BucketCreateException)
-from .retry import retry
+from .retry import retry, retry_multi
 from .cb_session import CBSession, BucketMode
 from .cb_bucket import Bucket as CouchbaseBucket
 from .cb_index import CBQueryIndex
@@ -13,7 +13,7 @@ from .cb_search_index import CBSearchIndex
 import logging
 import hashlib
 from datetime import timedelta
-from typing import Union, Dict, Any, List
+from typing import Union, Dict, Any, List, Optional
 import couchbase.search as search
 from couchbase.diagnostics import ServiceType
 from couchbase.cluster import Cluster
@@ -21,22 +21,32 @@ from couchbase.bucket import Bucket
 from couchbase.scope import Scope
 from couchbase.collection import Collection
 from couchbase.options import QueryOptions, SearchOptions, WaitUntilReadyOptions, ScanOptions
-from couchbase.kv_range_scan import RangeScan
+from couchbase.kv_range_scan import RangeScan, SamplingScan, ScanTerm
 from couchbase.management.search import SearchIndex
 from couchbase.management.users import Role, User, Group
 from couchbase.management.buckets import CreateBucketSettings, BucketType, EvictionPolicyType, CompressionMode, ConflictResolutionType
 from couchbase.management.collections import CollectionSpec
-from couchbase.management.options import CreateQueryIndexOptions, CreatePrimaryQueryIndexOptions, WatchQueryIndexOptions
+from couchbase.management.options import CreateQueryIndexOptions, CreatePrimaryQueryIndexOptions, WatchQueryIndexOptions, BuildDeferredQueryIndexOptions
 from couchbase.vector_search import VectorQuery, VectorSearch
 from couchbase.exceptions import (BucketNotFoundException, ScopeNotFoundException, CollectionNotFoundException, BucketAlreadyExistsException, ScopeAlreadyExistsException,
                                   CollectionAlreadyExistsException, QueryIndexAlreadyExistsException, DocumentNotFoundException, WatchQueryIndexTimeoutException,
-                                  BucketDoesNotExistException, BucketNotFlushableException)
+                                  BucketDoesNotExistException, BucketNotFlushableException, DocumentExistsException)
 
 logger = logging.getLogger('cbutil.connect.lite')
 logger.addHandler(logging.NullHandler())
 JSONType = Union[str, int, float, bool, None, Dict[str, Any], List[Any]]
 
 
+@attr.s
+class BulkResult:
+    results: Optional[dict] = attr.ib(factory=dict)
+    errors: Optional[dict] = attr.ib(factory=dict)
+
+    @property
+    def all_ok(self) -> bool:
+        return len(self.errors) == 0
+
+
 class CBConnectLite(CBSession):
 
     def __init__(self, *args, **kwargs):
@@ -205,6 +215,27 @@ class CBConnectLite(CBSession):
         for res in scanner.rows():
             yield res.id
 
+    @staticmethod
+    def scan_range(collection: Collection, start: str = None, end: str = None, ids_only: bool = False, concurrency: int = 16):
+        scan_type = RangeScan(ScanTerm(start) if start is not None else None, ScanTerm(end, exclusive=True) if end is not None else None)
+        scanner = collection.scan(scan_type, ScanOptions(ids_only=ids_only, concurrency=concurrency))
+        for res in scanner.rows():
+            yield res.id, None if ids_only else res.content_as[dict]
+
+    @staticmethod
+    def sample_keys(collection: Collection, limit: int, seed: int = None) -> List[str]:
+        scanner = collection.scan(SamplingScan(limit, seed), ScanOptions(ids_only=True))
+        return [res.id for res in scanner.rows()]
+
+    @staticmethod
+    def key_ranges(keys: List[str], partitions: int):
+        keys = sorted(set(keys))
+        if partitions <= 1 or len(keys) < partitions:
+            return [(None, None)]
+        bounds = sorted(set(keys[len(keys) * n // partitions] for n in range(1, partitions)))
+        edges = [None] + bounds + [None]
+        return list(zip(edges[:-1], edges[1:]))
+
     @property
     def user_list(self):
         if self._cluster is None:
@@ -307,6 +338,17 @@ class CBConnectLite(CBSession):
         result = collection.upsert(doc_id, document)
         return result.cas
 
+    @staticmethod
+    def get_docs(collection: Collection, doc_ids: List[str]) -> BulkResult:
+        results, errors = retry_multi(collection.get_multi, list(doc_ids), no_retry_list=(DocumentNotFoundException, ScopeNotFoundException, CollectionNotFoundException))
+        return BulkResult({key: result.content_as[dict] for key, result in results.items()}, errors)
+
+    @staticmethod
+    def put_docs(collection: Collection, documents: Dict[str, JSONType], safe: bool = False) -> BulkResult:
+        operation = collection.insert_multi if safe else collection.upsert_multi
+        results, errors = retry_multi(operation, documents, no_retry_list=(DocumentExistsException, ScopeNotFoundException, CollectionNotFoundException))
+        return BulkResult({key: result.cas for key, result in results.items()}, errors)
+
     @staticmethod
     def _vector_search(scope: Scope,
                        index: str,
@@ -360,7 +402,7 @@ class CBConnectLite(CBSession):
             vector_fields = ["vector_field"]
         sixm = scope.search_indexes()
         search_index = CBSearchIndex().create(f"{scope_name}.{collection_name}", dims, vector_fields, similarity, text_field, default, metadata)
-        parameters = attrs.asdict(search_index)
+        parameters = attr.asdict(search_index)
 
         idx = SearchIndex(name=name,
                           idx_type='fulltext-index',
@@ -431,6 +473,35 @@ class CBConnectLite(CBSession):
         else:
             qim.create_index(bucket_name, index.name, index.index_key, index_options)
 
+    @retry()
+    def index_build_deferred(self, bucket: str, scope: str = "_default", collection: str = "_default"):
+        qim = self._cluster.query_indexes()
+        if scope != "_default" or collection != "_default":
+            qim.build_deferred_indexes(bucket, BuildDeferredQueryIndexOptions(scope_name=scope, collection_name=collection))
+        else:
+            qim.build_deferred_indexes(bucket)
+
+    @retry()
+    def index_build(self, bucket: str, scope: str, collection: str, names: List[str]):
+        deferred = []
+        for index in self.index_list:
+            if index.name not in names or index.state != 'deferred':
+                continue
+            if index.bucket_id:
+                if index.bucket_id == bucket and index.scope_id == scope and index.keyspace_id == collection:
+                    deferred.append(index.name)
+            elif scope == '_default' and collection == '_default' and index.keyspace_id == bucket:
+                deferred.append(index.name)
+        if not deferred:
+            return
+        if scope != "_default" or collection != "_default":
+            keyspace = f"`{bucket}`.`{scope}`.`{collection}`"
+        else:
+            keyspace = f"`{bucket}`"
+        index_names = ', '.join(f"`{name}`" for name in deferred)
+        logger.debug(f"building indexes {index_names} on {keyspace}")
+        self.run_query(self._cluster, f"BUILD INDEX ON {keyspace}({index_names}) USING GSI ;")
+
     @retry()
     def create_indexes(self, cluster: Cluster, bucket: Bucket, scope: Scope, collection: Collection, fields: List[str], replica: int = 0):
         if collection.name != '_default':
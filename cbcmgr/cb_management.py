@@ -27,7 +27,7 @@ from couchbase.management.collections import CollectionSpec
 from couchbase.exceptions import (QueryIndexNotFoundException, QueryIndexAlreadyExistsException, BucketAlreadyExistsException, BucketNotFoundException, BucketDoesNotExistException,
                                   WatchQueryIndexTimeoutException, ScopeAlreadyExistsException, CollectionAlreadyExistsException, CollectionNotFoundException)
 from couchbase.management.queries import (CreateQueryIndexOptions, CreatePrimaryQueryIndexOptions, WatchQueryIndexOptions, DropPrimaryQueryIndexOptions, DropQueryIndexOptions)
-from couchbase.management.options import CreateBucketOptions, CreateScopeOptions, CreateCollectionOptions, GetAllQueryIndexOptions
+from couchbase.management.options import CreateBucketOptions, CreateScopeOptions, CreateCollectionOptions
 from couchbase.options import WaitUntilReadyOptions, UpsertOptions
 from couchbase.management.logic.buckets_logic import BucketType, CompressionMode, ConflictResolutionType, EvictionPolicyType
 
@@ -244,15 +244,12 @@ class CBManager(CBConnect):
             except Exception as err:
                 print(f"query service not ready: {err}")
 
-    def cluster_schema_dump(self) -> dict:
+    def cluster_schema_dump(self, refresh: bool = True) -> dict:
         inventory = {
             "inventory": []
         }
-        cluster = Cluster.connect(self.cb_connect_string, self.cluster_options)
-        bm = cluster.buckets()
-        qim = cluster.query_indexes()
-        buckets = bm.get_all_buckets()
-        for b in buckets:
+        snapshot = self.metadata_snapshot(refresh=refresh)
+        for b in snapshot.buckets:
             schema = {
                 b.name: {
                     "buckets": [
@@ -263,28 +260,16 @@ class CBManager(CBConnect):
                     ]
                 }
             }
-            logger.debug(f"scanning bucket {b.name}")
-            bucket = cluster.bucket(b.name)
-            cm = bucket.collections()
-            scopes = cm.get_all_scopes()
-            for s in scopes:
+            for s in snapshot.scope_list(b.name):
                 schema_scope = {
                     "name": s.name,
                     "collections": []
                 }
-                logger.debug(f"scanning scope {s.name}")
-                collections = s.collections
-                for c in collections:
-                    logger.debug(f"scanning collection {c.name}")
-                    primary_index = False
-                    index_get_options = GetAllQueryIndexOptions(scope_name=s.name, collection_name=c.name)
-                    indexes = qim.get_all_indexes(b.name, index_get_options)
-                    index_names = list(map(lambda i: i.name, [index for index in indexes]))
-                    index_keys_lists = list(map(lambda i: i.index_key, [index for index in indexes]))
-                    index_keys = [item.strip('`') for sublist in index_keys_lists for item in sublist]
-                    if '#primary' in index_names:
-                        primary_index = True
-                        index_names.remove('#primary')
+                for c in s.collections:
+                    indexes = snapshot.collection_indexes(b.name, s.name, c.name)
+                    index_names = [index.name for index in indexes]
+                    index_keys = [item.strip('`') for index in indexes for item in (index.index_key or [])]
+                    primary_index = '#primary' in index_names
                     schema_collection = {
                         "name": c.name,
                         "schema": {},
@@ -0,0 +1,93 @@
+##
+##
+
+import attr
+import time
+import logging
+import threading
+import concurrent.futures
+from typing import Callable, Dict, List, Optional
+from couchbase.cluster import Cluster
+from couchbase.options import QueryOptions
+from .cb_index import CBQueryIndex
+from .retry import retry
+
+logger = logging.getLogger('cbutil.metadata')
+logger.addHandler(logging.NullHandler())
+snapshot_cache = {}
+snapshot_locks = {}
+cache_lock = threading.Lock()
+
+
+@retry()
+def fetch_scopes(cluster: Cluster, bucket: str) -> list:
+    logger.debug(f"scanning bucket {bucket}")
+    return cluster.bucket(bucket).collections().get_all_scopes()
+
+
+@retry()
+def fetch_indexes(cluster: Cluster) -> List[CBQueryIndex]:
+    index_list = []
+    results = cluster.query(r"SELECT * FROM system:indexes ;", QueryOptions(metrics=False, adhoc=True))
+    for row in results:
+        for key, value in row.items():
+            index_list.append(CBQueryIndex.from_dict(value))
+    return index_list
+
+
+@attr.s
+class MetadataSnapshot:
+    buckets: Optional[list] = attr.ib(factory=list)
+    scopes: Optional[Dict[str, list]] = attr.ib(factory=dict)
+    indexes: Optional[List[CBQueryIndex]] = attr.ib(factory=list)
+    created: Optional[float] = attr.ib(factory=time.monotonic)
+
+    @classmethod
+    def collect(cls, cluster: Cluster, max_workers: int = 8):
+        buckets = cluster.buckets().get_all_buckets()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            index_task = executor.submit(fetch_indexes, cluster)
+            scope_tasks = {b.name: executor.submit(fetch_scopes, cluster, b.name) for b in buckets}
+            scopes = {name: task.result() for name, task in scope_tasks.items()}
+            indexes = index_task.result()
+        return cls(buckets, scopes, indexes)
+
+    @classmethod
+    def cached(cls, key: str, connect: Callable[[], Cluster], ttl: float = 60.0, refresh: bool = False):
+        with cache_lock:
+            key_lock = snapshot_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            snapshot = snapshot_cache.get(key)
+            if refresh or not snapshot or snapshot.age > ttl:
+                logger.debug(f"collecting metadata snapshot for {key}")
+                snapshot = cls.collect(connect())
+                snapshot_cache[key] = snapshot
+            return snapshot
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    def scope_list(self, bucket: str) -> list:
+        return self.scopes.get(bucket, [])
+
+    def collection_list(self, bucket: str, scope: str) -> list:
+        scope_obj = next((s for s in self.scope_list(bucket) if s.name == scope), None)
+        if not scope_obj:
+            raise ValueError(f"scope {scope} not found")
+        return scope_obj.collections
+
+    def collection_indexes(self, bucket: str, scope: str, collection: str) -> List[CBQueryIndex]:
+        index_list = []
+        for index in self.indexes:
+            if index.using not in (None, 'gsi'):
+                continue
+            if index.bucket_id:
+                if index.bucket_id == bucket and index.scope_id == scope and index.keyspace_id == collection:
+                    index_list.append(index)
+            elif scope == '_default' and collection == '_default' and index.keyspace_id == bucket:
+                index_list.append(index)
+        return index_list
+
+    def bucket_indexes(self, bucket: str) -> List[CBQueryIndex]:
+        return [index for index in self.indexes if index.keyspace_id == bucket or index.bucket_id == bucket]
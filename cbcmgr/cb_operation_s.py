@@ -11,7 +11,8 @@ from couchbase.scope import Scope
 from couchbase.collection import Collection
 from couchbase.exceptions import (BucketDoesNotExistException, BucketNotFoundException, ScopeNotFoundException, CollectionNotFoundException)
 from cbcmgr.cb_session import BucketMode
-from cbcmgr.cb_connect_lite import CBConnectLite
+from cbcmgr.cb_connect_lite import CBConnectLite, BulkResult
+from cbcmgr.exceptions import CollectionGetError, CollectionUpsertError
 from cbcmgr.cb_bucket import Bucket as CouchbaseBucket, BucketType
 
 logger = logging.getLogger('cbutil.operation')
@@ -23,6 +24,8 @@ class Operation(Enum):
     READ = 0
     WRITE = 1
     QUERY = 2
+    READ_MULTI = 3
+    WRITE_MULTI = 4
 
 
 class CBOperation(CBConnectLite):
@@ -93,6 +96,54 @@ class CBOperation(CBConnectLite):
         def result(self):
             return self._result
 
+    class DBReadMulti:
+
+        def __init__(self, opm: CBOperation):
+            self.opm = opm
+            self._result = None
+            self.doc_ids = None
+
+        def prep(self, doc_ids: List[str]):
+            if doc_ids is None:
+                raise TypeError("doc ID list can not be None")
+            self.doc_ids = doc_ids
+            return self
+
+        def execute(self):
+            self._result = self.opm.get_docs(self.opm.collection, self.doc_ids)
+            if not self._result.all_ok:
+                key, err = next(iter(self._result.errors.items()))
+                raise CollectionGetError(f"{len(self._result.errors)} of {len(self.doc_ids)} read(s) failed: {key}: {err}")
+            return self._result.results
+
+        @property
+        def result(self):
+            return self._result
+
+    class DBWriteMulti:
+
+        def __init__(self, opm: CBOperation):
+            self.opm = opm
+            self._result = None
+            self.documents: Dict[str, JSONType] = None
+
+        def prep(self, documents: Dict[str, JSONType]):
+            if documents is None:
+                raise TypeError("documents can not be None")
+            self.documents = documents
+            return self
+
+        def execute(self):
+            self._result = self.opm.put_docs(self.opm.collection, self.documents)
+            if not self._result.all_ok:
+                key, err = next(iter(self._result.errors.items()))
+                raise CollectionUpsertError(f"{len(self._result.errors)} of {len(self.documents)} write(s) failed: {key}: {err}")
+            return self._result.results
+
+        @property
+        def result(self):
+            return self._result
+
     class DBQuery:
 
         def __init__(self, opm: CBOperation):
@@ -248,6 +299,12 @@ class CBOperation(CBConnectLite):
     def put(self, doc_id: str, data: dict):
         return self.put_doc(self._collection, doc_id, data)
 
+    def get_multi(self, doc_ids: List[str]) -> BulkResult:
+        return self.get_docs(self._collection, doc_ids)
+
+    def put_multi(self, documents: Dict[str, JSONType]) -> BulkResult:
+        return self.put_docs(self._collection, documents)
+
     def get_count(self) -> int:
         return self.collection_count(self._cluster, self.get_keyspace)
 
@@ -278,5 +335,9 @@ class CBOperation(CBConnectLite):
             return self.DBWrite(self)
         elif op == Operation.QUERY:
             return self.DBQuery(self)
+        elif op == Operation.READ_MULTI:
+            return self.DBReadMulti(self)
+        elif op == Operation.WRITE_MULTI:
+            return self.DBWriteMulti(self)
         else:
             raise ValueError(f"unknown operation {op.name}")
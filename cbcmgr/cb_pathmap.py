@@ -104,6 +104,6 @@ class CBPathMap(object):
                 for n, document in enumerate(subset):
                     number = document.get(c.id_key, n)
                     doc_id = doc_id_format("%t%s%f%s%n", text=prefix, field=c.id_key, number=number)
-                    self.pool.dispatch(keyspace, Operation.WRITE, doc_id, document)
+                    self.pool.put(keyspace, doc_id, document)
 
         self.pool.join()
@@ -5,6 +5,7 @@ from .exceptions import (DNSLookupTimeout, NodeUnreachable, NodeConnectionTimeou
 from .retry import retry
 from .httpsessionmgr import APISession
 from .config import KeyStyle
+from .cb_metadata import MetadataSnapshot
 import logging
 import socket
 import dns.resolver
@@ -108,6 +109,9 @@ class CBSession(object):
     def session(self) -> Cluster:
         return Cluster.connect(self.cb_connect_string, self.cluster_options)
 
+    def metadata_snapshot(self, refresh: bool = False) -> MetadataSnapshot:
+        return MetadataSnapshot.cached(f"{self.username}@{self.cb_connect_string}", lambda: self._cluster or self.session(), refresh=refresh)
+
     @retry()
     async def session_a(self) -> AsyncCluster:
         cluster = await AsyncCluster.connect(self.cb_connect_string, self.cluster_options)
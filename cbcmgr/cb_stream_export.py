@@ -5,31 +5,100 @@ import concurrent.futures
 import logging
 import time
 import zlib
-import json
+import gzip
+import os
+import hashlib
+import queue
 import collections
 import threading
 import multiprocessing
-from functools import partial
 from itertools import islice
 from cbcmgr.cb_operation_s import CBOperation
 from cbcmgr.util import progress_count
+from cbcmgr.ndjson_reader import NDJSONReader
+import cbcmgr.codec as codec
+from cbcmgr.exceptions import StreamShardError, StreamCheckpointError, StreamWriterError, StreamReaderError
 
 logger = logging.getLogger('cbutil.export.stream')
 logger.addHandler(logging.NullHandler())
+MANIFEST_FILE = 'manifest.json'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+
+def shard_file_name(n: int) -> str:
+    return f"shard-{n:04d}.ndjson.gz"
+
+
+def file_checksum(file_name: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as input_file:
+        while block := input_file.read(1048576):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def shard_out_worker(args: tuple, kwargs: dict, keyspace: str, file_name: str, start: str, end: str):
+    export = StreamExport(*args, keyspace=keyspace, file_name=file_name, **kwargs)
+    return export.shard_out(start, end)
+
+
+def shard_in_worker(args: tuple, kwargs: dict, keyspace: str, file_name: str, checksum: str):
+    export = StreamExport(*args, keyspace=keyspace, file_name=file_name, **kwargs)
+    return export.shard_in(checksum)
 
 
 class StreamExport(CBOperation):
 
-    def __init__(self, *args, keyspace: str, file_name: str, **kwargs):
+    def __init__(self,
+                 *args,
+                 keyspace: str,
+                 file_name: str,
+                 compress_level: int = 6,
+                 parallel: bool = False,
+                 block_size: int = 1048576,
+                 queue_depth: int = 1024,
+                 decode_workers: int = 0,
+                 max_in_flight: int = 32,
+                 shards: int = 1,
+                 quiet: bool = False,
+                 resume: bool = False,
+                 checkpoint_interval: float = 10.0,
+                 **kwargs):
         super().__init__(*args, **kwargs)
+        self.args = args
+        self.kwargs = kwargs
+        self.options = dict(
+            compress_level=compress_level,
+            parallel=parallel,
+            block_size=block_size,
+            queue_depth=queue_depth,
+            decode_workers=decode_workers,
+            max_in_flight=max_in_flight,
+            quiet=True,
+            resume=resume,
+            checkpoint_interval=checkpoint_interval
+        )
         self.tasks = set()
         self.executor = concurrent.futures.ThreadPoolExecutor()
         self.connect(keyspace)
-        self.queue = collections.deque()
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.chunk_queue = queue.Queue(maxsize=8)
         self.file_name = file_name
-        self.compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
-        self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        self.compress_level = compress_level
+        self.compress_threads = os.cpu_count() if parallel else 0
+        self.block_size = block_size
+        self.decode_workers = decode_workers
+        self.max_in_flight = max_in_flight
+        self.shards = shards
+        self.quiet = quiet
+        self.resume = resume
+        self.checkpoint_interval = checkpoint_interval
+        self.members = collections.deque([(0, 0)])
+        self.source_complete = False
+        self.reader_error = None
+        self.writer_error = None
         self.terminate = threading.Event()
+        self.stop = threading.Event()
         self.batch_size = 50
         self._error_count = multiprocessing.Value('i', 0)
         self._ops_per_sec: float = 1.0
@@ -57,6 +126,10 @@ class StreamExport(CBOperation):
                 self._error_count.value += 1
             logger.error(f"Put failed: {doc_id}: {err}")
 
+    def progress(self, total: int, finished: bool = False):
+        if not self.quiet:
+            progress_count(total, finished=finished, errors=self.error_count, ops_per_sec=self.ops_per_sec)
+
     def calc_ops_per_sec(self, n: int):
         now_time = time.perf_counter()
         self._run_count += n
@@ -64,96 +137,430 @@ class StreamExport(CBOperation):
         if run_duration > 0:
             self._ops_per_sec = self._run_count / run_duration
 
-    def to_file(self):
-        buffer = bytearray()
-        with open(self.file_name, 'wb') as zip_file:
-            while not self.terminate.is_set() or self.queue:
-                try:
-                    record = self.queue.pop()
-                    buffer.extend(record)
-                except IndexError:
-                    time.sleep(0.5)
+    def read_blocks(self):
+        parts = []
+        size = 0
+        count = 0
+        last_key = None
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            last_key, line = record
+            parts.append(line)
+            size += len(line)
+            count += 1
+            if size >= self.block_size:
+                yield b''.join(parts), last_key, count
+                parts.clear()
+                size = 0
+                count = 0
+        if parts:
+            yield b''.join(parts), last_key, count
+
+    def compress_block(self, block: bytes) -> bytes:
+        return gzip.compress(block, compresslevel=self.compress_level)
+
+    def to_file(self, offset: int = 0, records: int = 0, last_key: str = None):
+        try:
+            checkpoint_time = time.monotonic()
+            with open(self.file_name, 'r+b' if offset else 'wb') as zip_file:
+                zip_file.truncate(offset)
+                zip_file.seek(offset)
+                if self.compress_threads:
+                    pending = collections.deque()
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=self.compress_threads) as compressors:
+                        for block, key, count in self.read_blocks():
+                            pending.append((compressors.submit(self.compress_block, block), key, count))
+                            while len(pending) >= self.compress_threads * 2:
+                                task, last_key, count = pending.popleft()
+                                zip_file.write(task.result())
+                                records += count
+                                if self.checkpoint_due(checkpoint_time):
+                                    self.checkpoint_out(zip_file, last_key, records)
+                                    checkpoint_time = time.monotonic()
+                        while pending:
+                            task, last_key, count = pending.popleft()
+                            zip_file.write(task.result())
+                            records += count
                 else:
-                    if len(buffer) >= 131072:
-                        chunk = buffer[:131072]
-                        zip_file.write(self.compressor.compress(chunk))
-                        buffer = buffer[131072:]
-            if len(buffer) > 0:
-                zip_file.write(self.compressor.compress(buffer))
-            zip_file.write(self.compressor.flush())
-
-    def from_file(self):
-        with open(self.file_name, 'rb') as zip_file:
-            for chunk in iter(partial(zip_file.read, 131072), ''):
-                if len(chunk) == 0:
-                    break
-                part = self.decompressor.decompress(chunk)
-                self.queue.appendleft(part)
-        self.terminate.set()
-
-    def read_from_collection(self):
+                    compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+                    for block, last_key, count in self.read_blocks():
+                        zip_file.write(compressor.compress(block))
+                        records += count
+                        if self.checkpoint_due(checkpoint_time):
+                            zip_file.write(compressor.flush())
+                            compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+                            self.checkpoint_out(zip_file, last_key, records)
+                            checkpoint_time = time.monotonic()
+                    zip_file.write(compressor.flush())
+                if self.checkpoint_interval:
+                    self.checkpoint_out(zip_file, last_key, records, complete=self.source_complete)
+        except StreamWriterError as err:
+            self.writer_error = err
+        except Exception as err:
+            self.writer_error = StreamWriterError(f"can not write {self.file_name}: {err}")
+        if self.writer_error:
+            self.stop.set()
+            self.drain_queue(self.queue)
+
+    def drain_queue(self, q: queue.Queue):
+        while not (self.terminate.is_set() and q.empty()):
+            try:
+                q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def from_file(self, offset: int = 0, lines: int = 0):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        member_offset = offset
+        buffer = bytearray(self.block_size)
+        view = memoryview(buffer)
+        try:
+            with open(self.file_name, 'rb') as zip_file:
+                zip_file.seek(offset)
+                while not self.stop.is_set() and (n := zip_file.readinto(buffer)):
+                    offset += n
+                    data = view[:n]
+                    while True:
+                        part = decompressor.decompress(data, self.block_size)
+                        if part:
+                            lines += part.count(b'\n')
+                            self.chunk_queue.put(part)
+                        if decompressor.eof:
+                            data = decompressor.unused_data
+                            member_offset = offset - len(data)
+                            self.members.append((member_offset, lines))
+                            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                            if not data:
+                                break
+                        else:
+                            data = decompressor.unconsumed_tail
+                            if not data and len(part) < self.block_size:
+                                break
+            if not self.stop.is_set() and offset > member_offset:
+                raise StreamReaderError(f"{self.file_name} is truncated: incomplete gzip member at offset {member_offset}")
+            self.source_complete = not self.stop.is_set()
+        except StreamReaderError as err:
+            self.reader_error = err
+        except Exception as err:
+            self.reader_error = StreamReaderError(f"can not read {self.file_name}: {err}")
+        finally:
+            self.chunk_queue.put(None)
+            self.terminate.set()
+
+    def ordered_doc_list(self, after: str = None):
+        query = f"select meta().id from {self.from_keyspace}"
+        if after is not None:
+            query += f" where meta().id > {codec.dumps(after)}"
+        query += " order by meta().id ;"
+        for record in self.run_query(self._cluster, query):
+            yield record.get('id')
+
+    def read_from_collection(self, after: str = None):
         total = 0
-        for doc_list in self.slice(self.doc_list(), self.batch_size):
-            self.tasks.clear()
-            for doc_id in doc_list:
-                self.tasks.add(self.executor.submit(self.get_worker, doc_id))
-            results = self.task_wait(self.tasks)
-            for data in results:
-                block = json.dumps(data).encode('utf-8')
-                self.queue.appendleft(block + b'\n')
+        try:
+            for doc_list in self.slice(self.ordered_doc_list(after), self.batch_size):
+                result = self.get_multi(doc_list)
+                if result.errors:
+                    with self._error_count.get_lock():
+                        self._error_count.value += len(result.errors)
+                    for doc_id, err in islice(result.errors.items(), 10):
+                        logger.error(f"Get failed: {doc_id}: {err}")
+                if self.stop.is_set():
+                    raise StreamWriterError(f"stream writer for {self.file_name} failed")
+                for doc_id in doc_list:
+                    if doc_id not in result.results:
+                        continue
+                    block = codec.dumpb(dict(doc_id=doc_id, document=result.results[doc_id]))
+                    self.queue.put((doc_id, block + b'\n'))
+                    total += 1
+                self.calc_ops_per_sec(len(doc_list))
+                self.progress(total)
+            self.source_complete = True
+        finally:
+            self.queue.put(None)
+            self.terminate.set()
+        self.progress(total, finished=True)
+        return total
+
+    def put_batch_worker(self, documents: dict):
+        result = self.put_multi(documents)
+        if result.errors:
+            with self._error_count.get_lock():
+                self._error_count.value += len(result.errors)
+            for doc_id, err in islice(result.errors.items(), 10):
+                logger.error(f"Put failed: {doc_id}: {err}")
+        return len(result.results)
+
+    def write_to_collection(self, records: int = 0, skip: int = 0):
+        reader = NDJSONReader(iter(self.chunk_queue.get, None), batch_size=self.batch_size, workers=self.decode_workers, skip=skip)
+        total = 0
+        consumed = 0
+        checkpoint_time = time.monotonic()
+        pending = collections.deque()
+        for batch in reader.batches():
+            lines = reader.count + reader.errors - consumed
+            consumed += lines
+            documents = {}
+            for data in batch:
+                doc_id = data.get('doc_id') if isinstance(data, dict) else None
+                document = data.get('document') if doc_id else None
+                if not document:
+                    with self._error_count.get_lock():
+                        self._error_count.value += 1
+                    logger.error(f"No document found in data stream")
+                    continue
+                documents[doc_id] = document
+            if documents:
+                task = self.executor.submit(self.put_batch_worker, documents)
+            else:
+                task = concurrent.futures.Future()
+                task.set_result(0)
+            pending.append((task, lines))
+            while pending and (len(pending) >= self.max_in_flight or pending[0][0].done()):
+                task, lines = pending.popleft()
+                total += sum(self.task_wait([task]))
+                records += lines
+                self.progress(total)
+            if self.checkpoint_due(checkpoint_time):
+                self.checkpoint_in(records)
+                checkpoint_time = time.monotonic()
+            self.calc_ops_per_sec(len(documents))
+        while pending:
+            task, lines = pending.popleft()
+            total += sum(self.task_wait([task]))
+            records += lines
+        with self._error_count.get_lock():
+            self._error_count.value += reader.errors
+        if self.checkpoint_interval:
+            self.checkpoint_in(records, complete=self.source_complete)
+        self.progress(total, finished=True)
+        return total
+
+    def read_range(self, start: str = None, end: str = None):
+        total = 0
+        try:
+            for doc_id, document in self.scan_range(self._collection, start, end):
+                if self.stop.is_set():
+                    raise StreamWriterError(f"stream writer for {self.file_name} failed")
+                block = codec.dumpb(dict(doc_id=doc_id, document=document))
+                self.queue.put((doc_id, block + b'\n'))
                 total += 1
-            self.calc_ops_per_sec(self.batch_size)
-            progress_count(total, errors=self.error_count, ops_per_sec=self.ops_per_sec)
-        self.terminate.set()
-        progress_count(total, finished=True, errors=self.error_count, ops_per_sec=self.ops_per_sec)
-
-    def write_to_collection(self):
-        decoder = json.JSONDecoder()
-        buffer = ''
+        finally:
+            self.queue.put(None)
+            self.terminate.set()
+        return total
+
+    @property
+    def checkpoint_file(self) -> str:
+        if os.path.isdir(self.file_name):
+            return os.path.join(self.file_name, CHECKPOINT_FILE)
+        return f"{self.file_name}.checkpoint"
+
+    def checkpoint_due(self, checkpoint_time: float) -> bool:
+        return bool(self.checkpoint_interval) and time.monotonic() - checkpoint_time >= self.checkpoint_interval
+
+    def save_checkpoint(self, **state):
+        state.update(
+            file=os.path.basename(self.file_name),
+            errors=self.error_count,
+            updated=time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        )
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, 'w') as checkpoint_file:
+            codec.dump(state, checkpoint_file)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def load_checkpoint(self, mode: str) -> dict:
+        if not self.resume:
+            return {}
+        try:
+            with open(self.checkpoint_file, 'r') as checkpoint_file:
+                state = codec.load(checkpoint_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            raise StreamCheckpointError(f"can not read checkpoint {self.checkpoint_file}: {err}")
+        if state.get('mode') != mode:
+            raise StreamCheckpointError(f"checkpoint {self.checkpoint_file} is not a stream {mode} checkpoint")
+        with self._error_count.get_lock():
+            self._error_count.value = state.get('errors', 0)
+        logger.info(f"resuming stream {mode} from checkpoint {self.checkpoint_file}")
+        return state
+
+    def checkpoint_out(self, zip_file, last_key: str, records: int, complete: bool = False):
+        zip_file.flush()
+        os.fsync(zip_file.fileno())
+        self.save_checkpoint(mode='out', last_key=last_key, offset=zip_file.tell(), records=records, complete=complete)
+
+    def checkpoint_in(self, records: int, complete: bool = False):
+        while len(self.members) > 1 and self.members[1][1] <= records:
+            self.members.popleft()
+        offset, lines = self.members[0]
+        self.save_checkpoint(mode='in', records=records, offset=offset, member_records=lines, complete=complete)
+
+    def shard_out(self, start: str = None, end: str = None):
+        writer = threading.Thread(target=self.to_file)
+        writer.start()
+        try:
+            count = self.read_range(start, end)
+        finally:
+            writer.join()
+            if self.writer_error:
+                raise self.writer_error
+        return dict(
+            file=os.path.basename(self.file_name),
+            start=start,
+            end=end,
+            documents=count,
+            bytes=os.path.getsize(self.file_name),
+            sha256=file_checksum(self.file_name),
+            status='complete'
+        )
+
+    def shard_in(self, checksum: str):
+        if file_checksum(self.file_name) != checksum:
+            raise StreamShardError(f"checksum mismatch for shard {self.file_name}")
+        count = self.stream_in()
+        return dict(documents=count, errors=self.error_count)
+
+    @property
+    def worker_kwargs(self):
+        return dict(**self.kwargs, **self.options)
+
+    @property
+    def shard_workers(self):
+        return min(self.shards, os.cpu_count())
+
+    def write_manifest(self, shards: list):
+        manifest = dict(
+            keyspace=self.get_keyspace,
+            format='ndjson.gz',
+            created=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            documents=sum(shard['documents'] for shard in shards),
+            bytes=sum(shard['bytes'] for shard in shards),
+            shards=shards
+        )
+        temp_file = os.path.join(self.file_name, f"{MANIFEST_FILE}.tmp")
+        with open(temp_file, 'w') as manifest_file:
+            codec.dump(manifest, manifest_file, indent=True)
+        os.replace(temp_file, os.path.join(self.file_name, MANIFEST_FILE))
+        return manifest
+
+    def read_manifest(self) -> dict:
+        manifest_path = os.path.join(self.file_name, MANIFEST_FILE)
+        try:
+            with open(manifest_path, 'r') as manifest_file:
+                return codec.load(manifest_file)
+        except (OSError, ValueError) as err:
+            raise StreamShardError(f"can not read manifest {manifest_path}: {err}")
+
+    def stream_out_shards(self):
+        os.makedirs(self.file_name, exist_ok=True)
+        if self.resume and os.path.exists(os.path.join(self.file_name, MANIFEST_FILE)):
+            shards = self.read_manifest().get('shards', [])
+            logger.info(f"resuming stream out to {self.file_name}")
+        else:
+            keys = self.sample_keys(self._collection, self.shards * 100)
+            shards = [dict(file=shard_file_name(n), start=start, end=end, documents=0, bytes=0, sha256=None, status='pending')
+                      for n, (start, end) in enumerate(self.key_ranges(keys, self.shards))]
+        self.write_manifest(shards)
+        worker_kwargs = dict(self.worker_kwargs, checkpoint_interval=0)
         total = 0
-        while not self.terminate.is_set() or self.queue:
-            try:
-                record = self.queue.pop()
-                contents = record.decode('utf-8')
-                buffer += contents
-                self.tasks.clear()
-                count = 0
-                while buffer:
-                    try:
-                        json_object, position = decoder.raw_decode(buffer)
-                        data = dict(json_object).copy()
-                        doc_id = data.get('doc_id')
-                        document = data.get('document', {})
-                        if not doc_id or not document:
-                            with self._error_count.get_lock():
-                                self._error_count.value += 1
-                            logger.error(f"No document found in data stream")
-                        else:
-                            self.tasks.add(self.executor.submit(self.put_worker, doc_id, document))
-                            count += 1
-                        buffer = buffer[position:]
-                        buffer = buffer.lstrip()
-                    except ValueError:
-                        break
-                self.task_wait(self.tasks)
-                total += count
-                self.calc_ops_per_sec(count)
-                progress_count(total, errors=self.error_count, ops_per_sec=self.ops_per_sec)
-            except IndexError:
-                time.sleep(0.5)
-        progress_count(total, finished=True, errors=self.error_count, ops_per_sec=self.ops_per_sec)
+        failed = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.shard_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            tasks = {}
+            for n, shard in enumerate(shards):
+                if shard['status'] == 'complete':
+                    continue
+                shard_file = os.path.join(self.file_name, shard['file'])
+                tasks[executor.submit(shard_out_worker, self.args, worker_kwargs, self.get_keyspace, shard_file, shard['start'], shard['end'])] = n
+            for task in concurrent.futures.as_completed(tasks):
+                n = tasks[task]
+                try:
+                    shards[n] = task.result()
+                    total += shards[n]['documents']
+                    self.calc_ops_per_sec(shards[n]['documents'])
+                except Exception as err:
+                    logger.error(f"shard {n} export failed: {type(err).__name__}: {err}")
+                    shards[n]['status'] = 'failed'
+                    failed.append(n)
+                self.write_manifest(shards)
+                self.progress(total)
+        self.progress(total, finished=True)
+        if failed:
+            raise StreamShardError(f"export failed for shard(s): {', '.join(map(str, sorted(failed)))}")
+        return total
+
+    def stream_in_shards(self):
+        manifest = self.read_manifest()
+        total = 0
+        failed = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.shard_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            tasks = {}
+            for shard in manifest.get('shards', []):
+                if shard.get('status') != 'complete':
+                    logger.warning(f"skipping incomplete shard {shard.get('file')}")
+                    continue
+                shard_file = os.path.join(self.file_name, shard['file'])
+                tasks[executor.submit(shard_in_worker, self.args, self.worker_kwargs, self.get_keyspace, shard_file, shard['sha256'])] = shard
+            for task in concurrent.futures.as_completed(tasks):
+                shard = tasks[task]
+                try:
+                    result = task.result()
+                    total += result['documents']
+                    with self._error_count.get_lock():
+                        self._error_count.value += result['errors']
+                    self.calc_ops_per_sec(result['documents'])
+                except Exception as err:
+                    logger.error(f"shard {shard['file']} import failed: {type(err).__name__}: {err}")
+                    failed.append(shard['file'])
+                self.progress(total)
+        self.progress(total, finished=True)
+        if failed:
+            raise StreamShardError(f"import failed for shard(s): {', '.join(failed)}")
+        return total
 
     def stream_out(self):
-        writer = threading.Thread(target=self.to_file)
+        if self.shards > 1:
+            return self.stream_out_shards()
+        state = self.load_checkpoint('out')
+        if state.get('complete'):
+            logger.info(f"stream out to {self.file_name} is already complete")
+            return 0
+        writer = threading.Thread(target=self.to_file, args=(state.get('offset', 0), state.get('records', 0), state.get('last_key')))
         writer.start()
-        self.read_from_collection()
-        writer.join()
+        try:
+            total = self.read_from_collection(state.get('last_key'))
+        finally:
+            writer.join()
+            if self.writer_error:
+                raise self.writer_error
+        return total
 
     def stream_in(self):
-        reader = threading.Thread(target=self.from_file)
+        if os.path.isdir(self.file_name):
+            return self.stream_in_shards()
+        state = self.load_checkpoint('in')
+        if state.get('complete'):
+            logger.info(f"stream in from {self.file_name} is already complete")
+            return 0
+        offset = state.get('offset', 0)
+        lines = state.get('member_records', 0)
+        records = state.get('records', 0)
+        self.members = collections.deque([(offset, lines)])
+        reader = threading.Thread(target=self.from_file, args=(offset, lines))
         reader.start()
-        self.write_to_collection()
-        reader.join()
+        try:
+            total = self.write_to_collection(records, records - lines)
+        finally:
+            self.stop.set()
+            self.drain_queue(self.chunk_queue)
+            reader.join()
+        if self.reader_error:
+            raise self.reader_error
+        return total
 
     def task_wait(self, tasks):
         result_set = []
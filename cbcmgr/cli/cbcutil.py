@@ -62,12 +62,16 @@ class CBCUtil(CLI):
         opt_parser.add_argument('--tls', action='store_true', help="Enable SSL")
         opt_parser.add_argument('--safe', action='store_true', help="Do not overwrite data")
         opt_parser.add_argument('--defer', action='store_true', help="Defer index build")
+        opt_parser.add_argument('--docs', action='store_true', help="Replicate document data")
         opt_parser.add_argument('-e', '--external', action='store_true', help='Use external network')
         opt_parser.add_argument('-f', '--file', action='store', help="File based collection schema JSON")
         opt_parser.add_argument('--outfile', action='store', help="Output file", default="output.dat")
         opt_parser.add_argument('--directory', action='store', help="Output directory")
         opt_parser.add_argument('--schema', action='store', help="Test Schema")
         opt_parser.add_argument('--count', action='store', help="Record Count", type=int_arg)
+        opt_parser.add_argument('--processes', action='store', help="Data generator process count", type=int_arg)
+        opt_parser.add_argument('--inflight', action='store', help="Maximum in-flight operations", type=int_arg)
+        opt_parser.add_argument('--tables', action='store', help="Tables to import concurrently", type=int_arg)
         opt_parser.add_argument('--replica', action='store', help="Replica Count", type=int_arg, default=1)
         opt_parser.add_argument('--quota', action='store', help="Bucket Memory Quota", type=int_arg)
         opt_parser.add_argument('--id', action='store', help="ID field for file based collection schema", default="record_id")
@@ -89,6 +93,8 @@ class CBCUtil(CLI):
         export_subparser = export_parser.add_subparsers(dest='export_command')
         export_subparser.add_parser('csv', help="Export CSV", parents=[opt_parser], add_help=False)
         export_subparser.add_parser('json', help="Export JSON", parents=[opt_parser], add_help=False)
+        export_subparser.add_parser('parquet', help="Export Parquet", parents=[opt_parser], add_help=False)
+        export_subparser.add_parser('arrow', help="Export Arrow IPC", parents=[opt_parser], add_help=False)
         replicate_parser = command_subparser.add_parser('replicate', help="Replicate Data", parents=[opt_parser], add_help=False)
         replicate_subparser = replicate_parser.add_subparsers(dest='replicate_command')
         replicate_subparser.add_parser('source', help="Source Side", parents=[opt_parser], add_help=False)
@@ -114,11 +120,15 @@ class CBCUtil(CLI):
                 CBExport().export(ExportType.csv)
             elif self.options.export_command == 'json':
                 CBExport().export(ExportType.json)
+            elif self.options.export_command == 'parquet':
+                CBExport().export(ExportType.parquet)
+            elif self.options.export_command == 'arrow':
+                CBExport().export(ExportType.arrow)
         elif self.options.command == 'import':
             PluginImport().import_tables()
         elif self.options.command == 'replicate':
             if self.options.replicate_command == 'source':
-                Replicator(self.options.filter).source()
+                Replicator(self.options.filter, data=self.options.docs).source()
             elif self.options.replicate_command == 'target':
                 Replicator(deferred=self.options.defer).target()
         elif self.options.command == 'bucket':
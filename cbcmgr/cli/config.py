@@ -42,6 +42,8 @@ op_mode = OperatingMode.LOAD.value
 continuous = False
 batch_size = 100
 count = 100
+process_count = 1
+max_in_flight = None
 replicas = 0
 bucket_quota = 256
 bucket_name = None
@@ -63,6 +65,7 @@ screen_output = False
 key_field = None
 plugin_name = None
 plugin_vars = {}
+table_parallel = 1
 
 
 def process_params(parameters: argparse.Namespace) -> None:
@@ -81,6 +84,8 @@ def process_params(parameters: argparse.Namespace) -> None:
         command, \
         op_mode, \
         count, \
+        process_count, \
+        max_in_flight, \
         replicas, \
         bucket_quota, \
         bucket_name, \
@@ -101,7 +106,8 @@ def process_params(parameters: argparse.Namespace) -> None:
         screen_output, \
         key_field, \
         plugin_name, \
-        plugin_vars
+        plugin_vars, \
+        table_parallel
 
     if parameters.user:
         username = parameters.user
@@ -156,6 +162,8 @@ def process_params(parameters: argparse.Namespace) -> None:
         key_field = parameters.docid
     if parameters.plugin:
         plugin_name = parameters.plugin
+    if parameters.tables:
+        table_parallel = parameters.tables
     if parameters.directory:
         output_dir = parameters.directory
     else:
@@ -176,6 +184,10 @@ def process_params(parameters: argparse.Namespace) -> None:
         op_mode = OperatingMode.LIST.value
     if parameters.count:
         count = parameters.count
+    if parameters.processes:
+        process_count = parameters.processes
+    if parameters.inflight:
+        max_in_flight = parameters.inflight
 
     if op_mode == OperatingMode.LIST.value:
         if parameters.wait:
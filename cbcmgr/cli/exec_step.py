@@ -4,11 +4,14 @@
 import logging
 import time
 import re
+from typing import Dict, List, Union
 from jinja2 import Template
+from couchbase.exceptions import DocumentExistsException, DocumentNotFoundException
 from cbcmgr.cb_connect import CBConnect
 from cbcmgr.cb_management import CBManager
 from cbcmgr.cb_bucket import Bucket
 from cbcmgr.cb_index import CBQueryIndex
+from cbcmgr.exceptions import CollectionGetError, CollectionUpsertError
 
 
 class DBRead(object):
@@ -36,6 +39,22 @@ class DBRead(object):
         self.execute(key)
         return self.result
 
+    def fetch_multi(self, keys: List[str]):
+        result = self.db.get_docs(keys)
+        failed = {key: err for key, err in result.errors.items() if not isinstance(err, DocumentNotFoundException)}
+        if failed:
+            key, err = next(iter(failed.items()))
+            raise CollectionGetError(f"{len(failed)} read(s) failed: {key}: {err}")
+        documents = []
+        for key in keys:
+            document = result.results.get(key)
+            if document is None:
+                continue
+            if self._add_key:
+                document[self._key_field] = key
+            documents.append(document)
+        return documents
+
 
 class DBWrite(object):
 
@@ -66,6 +85,23 @@ class DBWrite(object):
     def result(self):
         return self._result
 
+    def execute_multi(self, documents: Dict[Union[int, str], dict], no_squash: bool = False):
+        for key, document in documents.items():
+            try:
+                id_value = int(re.split(':', key)[-1])
+            except (ValueError, TypeError):
+                id_value = key
+            document[self.id_field] = id_value
+        begin_time = time.time()
+        result = self.db.put_docs(documents, safe=no_squash)
+        end_time = time.time()
+        failed = {key: err for key, err in result.errors.items() if not isinstance(err, DocumentExistsException)}
+        if failed:
+            key, err = next(iter(failed.items()))
+            raise CollectionUpsertError(f"{len(failed)} write(s) failed: {key}: {err}")
+        self.logger.debug(f"batch write of {len(documents)} complete in {end_time - begin_time:.6f}")
+        return len(result.results)
+
 
 class DBQuery(object):
 
@@ -3,25 +3,72 @@
 
 import logging
 import sys
-from enum import Enum
-import pandas as pd
-import json
+import os
+import csv
+import shutil
+import tempfile
+import multiprocessing
 import concurrent.futures
+from enum import Enum
 from cbcmgr.cli.exceptions import ExportException, ExportError
 from cbcmgr.cb_connect import CBConnect
 from cbcmgr.cb_management import CBManager
 import cbcmgr.cli.config as config
-from cbcmgr.cli.main import MainLoop
+import cbcmgr.codec as codec
 from cbcmgr.cli.schema import ProcessSchema
-from cbcmgr.cli.exec_step import DBRead, DBQuery
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def flatten(document: dict, prefix: str = ''):
+    row = {}
+    for key, value in document.items():
+        if isinstance(value, dict) and value:
+            row.update(flatten(value, f"{prefix}{key}."))
+        else:
+            row[f"{prefix}{key}"] = value
+    return row
+
+
+def export_worker(params: dict, bucket: str, scope: str, collection: str, start: str, end: str, part_file: str, flat: bool):
+    db = CBConnect(params['host'], params['username'], params['password'], ssl=params['tls']).connect(bucket, scope, collection)
+    count = 0
+    columns = {}
+    with open(part_file, 'w') as output:
+        for doc_id, document in db.cb_scan(start, end):
+            document['doc_id'] = doc_id
+            if flat:
+                document = flatten(document)
+                columns.update(dict.fromkeys(document))
+            output.write(codec.dumps(document) + '\n')
+            count += 1
+    return count, list(columns)
+
+
+def string_value(value):
+    if value is None or isinstance(value, str):
+        return value
+    return codec.dumps(value)
 
 
 class ExportType(Enum):
     csv = 0
     json = 1
+    parquet = 2
+    arrow = 3
+
+
+COLUMNAR_TYPES = (ExportType.parquet, ExportType.arrow)
 
 
 class CBExport(object):
+    sample_size = 10000
+    row_group_size = 65536
 
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -37,13 +84,138 @@ class CBExport(object):
     @staticmethod
     def import_schema():
         dbm = CBManager(config.host, config.username, config.password, ssl=config.tls)
-        inventory = dbm.cluster_schema_dump()
+        inventory = dbm.cluster_schema_dump(refresh=False)
         config.inventory = ProcessSchema(json_data=inventory).inventory()
         config.schema = config.inventory.get(config.bucket_name)
 
+    @staticmethod
+    def scan_workers(params: dict, bucket: str, scope: str, collection: str, ranges: list, part_files: list, flat: bool):
+        if len(ranges) == 1:
+            yield part_files[0], export_worker(params, bucket, scope, collection, None, None, part_files[0], flat)
+            return
+        with concurrent.futures.ProcessPoolExecutor(max_workers=config.process_count, mp_context=multiprocessing.get_context('spawn')) as executor:
+            tasks = {executor.submit(export_worker, params, bucket, scope, collection, start, end, part_file, flat): part_file
+                     for (start, end), part_file in zip(ranges, part_files)}
+            for task in concurrent.futures.as_completed(tasks):
+                yield tasks[task], task.result()
+
+    def scan_collection(self, bucket: str, scope: str, collection: str, part_dir: str, flat: bool, write_file=None):
+        params = dict(
+            host=config.host,
+            username=config.username,
+            password=config.password,
+            tls=config.tls
+        )
+        ranges = self.db.cb_key_ranges(config.process_count * 4)
+        part_files = [os.path.join(part_dir, f"part-{n:04d}") for n in range(len(ranges))]
+        self.logger.debug(f"scanning {len(ranges)} key range(s) with {config.process_count} process(es)")
+
+        count = 0
+        results = {}
+        for part_file, (part_count, part_columns) in self.scan_workers(params, bucket, scope, collection, ranges, part_files, flat):
+            count += part_count
+            results[part_file] = part_columns
+            if write_file:
+                self.write_json([part_file], write_file)
+                os.remove(part_file)
+
+        columns = {}
+        for part_file in part_files:
+            columns.update(dict.fromkeys(results[part_file]))
+        staged = [] if write_file else part_files
+        return count, staged, list(columns)
+
+    @staticmethod
+    def write_json(part_files: list, write_file):
+        for part_file in part_files:
+            with open(part_file, 'r') as part:
+                shutil.copyfileobj(part, write_file)
+
+    @staticmethod
+    def write_csv(part_files: list, columns: list, write_file):
+        writer = csv.DictWriter(write_file, fieldnames=columns)
+        writer.writeheader()
+        for part_file in part_files:
+            with open(part_file, 'r') as part:
+                for line in part:
+                    writer.writerow(codec.loads(line))
+
+    @staticmethod
+    def read_rows(part_files: list):
+        for part_file in part_files:
+            with open(part_file, 'r') as part:
+                for line in part:
+                    yield codec.loads(line)
+
+    def infer_schema(self, part_files: list, columns: list):
+        sample = {column: [] for column in columns}
+        for n, row in enumerate(self.read_rows(part_files)):
+            if n >= self.sample_size:
+                break
+            for column in columns:
+                sample[column].append(row.get(column))
+        fields = []
+        for column in columns:
+            try:
+                data_type = pa.array(sample[column]).type
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                data_type = pa.string()
+            if pa.types.is_null(data_type):
+                data_type = pa.string()
+            fields.append(pa.field(column, data_type))
+        return pa.schema(fields)
+
+    @staticmethod
+    def column_array(field, values: list):
+        if pa.types.is_string(field.type):
+            return pa.array([string_value(value) for value in values], type=field.type)
+        try:
+            return pa.array(values, type=field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            return None
+
+    def write_batches(self, part_files: list, schema, output_file: str, mode: ExportType):
+        if mode == ExportType.parquet:
+            writer = pq.ParquetWriter(output_file, schema)
+        else:
+            writer = pa.ipc.new_file(output_file, schema)
+        try:
+            rows = []
+            for row in self.read_rows(part_files):
+                rows.append(row)
+                if len(rows) < self.row_group_size:
+                    continue
+                mismatched = self.write_batch(writer, schema, rows)
+                if mismatched:
+                    return mismatched
+                rows.clear()
+            if rows:
+                return self.write_batch(writer, schema, rows)
+            return []
+        finally:
+            writer.close()
+
+    def write_batch(self, writer, schema, rows: list):
+        arrays = [self.column_array(field, [row.get(field.name) for row in rows]) for field in schema]
+        mismatched = [field.name for field, array in zip(schema, arrays) if array is None]
+        if not mismatched:
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        return mismatched
+
+    def write_columnar(self, part_files: list, columns: list, output_file: str, mode: ExportType):
+        schema = self.infer_schema(part_files, columns)
+        while True:
+            mismatched = self.write_batches(part_files, schema, output_file, mode)
+            if not mismatched:
+                return
+            for column in mismatched:
+                index = schema.get_field_index(column)
+                self.logger.warning(f"column {column}: values do not match inferred type {schema.field(index).type}, exporting as string")
+                schema = schema.set(index, pa.field(column, pa.string()))
+
     def export(self, mode: ExportType):
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.batch_size)
-        run_batch_size = config.batch_size * 10
+        if mode in COLUMNAR_TYPES and pa is None:
+            raise ExportError(f"the pyarrow package is required for {mode.name} export")
 
         for bucket in config.schema.buckets:
             self.db.bucket(bucket.name)
@@ -54,52 +226,41 @@ class CBExport(object):
                 self.db.scope(scope.name)
 
                 for collection in scope.collections:
-                    data = []
-                    tasks = set()
-
                     if config.collection_name and config.collection_name != collection.name:
                         continue
 
                     self.db.collection(collection.name)
 
-                    if not self.db.has_primary_index(create=config.create_indexes):
-                        raise ExportError("Primary index is required for export")
+                    self.logger.info(f"Processing collection {self.db.keyspace}")
+                    output_file = f"{config.output_dir}/{str(self.db.keyspace).replace('.','-')}.{mode.name}"
 
-                    operation_count = self.db.collection_count()
-                    if operation_count == 0:
-                        break
+                    with tempfile.TemporaryDirectory(dir=config.output_dir) as part_dir:
+                        write_file = None
+                        if mode == ExportType.json:
+                            write_file = sys.stdout if config.screen_output else open(output_file, 'w', newline='')
+                        try:
+                            count, part_files, columns = self.scan_collection(bucket.name, scope.name, collection.name, part_dir, mode != ExportType.json, write_file)
+                        except Exception as err:
+                            raise ExportError(f"export failed: {err}")
+                        finally:
+                            if write_file and write_file is not sys.stdout:
+                                write_file.close()
 
-                    query = r"select meta().id from {{ keyspace }} ;"
-                    query_op = DBQuery(self.db, query, keyspace=self.db.keyspace)
-                    query_op.execute()
+                        if count == 0:
+                            if write_file and write_file is not sys.stdout:
+                                os.remove(output_file)
+                            continue
 
-                    self.logger.info(f"Processing collection {self.db.keyspace}")
-                    output_file = f"{config.output_dir}/{str(self.db.keyspace).replace('.','-')}.{mode.name}"
+                        self.logger.info(f" == Retrieved {count} records")
+
+                        if mode == ExportType.json:
+                            continue
+
+                        self.logger.info(f" == Creating {output_file}")
+
+                        if mode in COLUMNAR_TYPES:
+                            self.write_columnar(part_files, columns, output_file, mode)
+                            continue
 
-                    db_op = DBRead(self.db, add_key=True)
-                    doc_id_list = query_op.result
-
-                    for n in range(1, len(doc_id_list) + 1, run_batch_size):
-                        tasks.clear()
-                        for b in range(n, n + run_batch_size):
-                            if b > len(doc_id_list):
-                                break
-                            tasks.add(executor.submit(db_op.fetch, doc_id_list[b-1]['id']))
-                        results = MainLoop().task_wait(tasks)
-                        data.extend(results)
-
-                    if self.db.has_primary_index() and config.create_indexes:
-                        self.db.revert_primary_index()
-
-                    self.logger.info(f" == Retrieved {operation_count} records")
-                    self.logger.info(f" == Creating {output_file}")
-
-                    if mode == ExportType.csv:
-                        df = pd.json_normalize(data)
-                        df.to_csv(output_file, encoding='utf-8', index=False)
-                    elif mode == ExportType.json:
-                        open(output_file, 'w').close()
-                        write_file = open(output_file, 'a') if not config.screen_output else sys.stdout
-                        for element in data:
-                            block = json.dumps(element)
-                            write_file.write(block + '\n')
+                        with open(output_file, 'w', newline='') as write_file:
+                            self.write_csv(part_files, columns, write_file)
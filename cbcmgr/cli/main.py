@@ -2,7 +2,6 @@
 #
 import enum
 import logging
-import json
 import re
 import sys
 import io
@@ -17,10 +16,42 @@ from cbcmgr.cb_management import CBManager
 from cbcmgr.cli.exceptions import TestRunError
 from cbcmgr.cli.exec_step import DBRead, DBWrite, DBQuery
 from cbcmgr.cli.schema import Bucket, Scope, Collection
-from cbcmgr.cli.schema import ProcessSchema, CollectionDoc, EnumEncoder
+from cbcmgr.cli.schema import ProcessSchema, CollectionDoc
 from cbcmgr.cli.keyformat import KeyStyle, KeyFormat
 from cbcmgr.cb_bucket import Bucket as CouchbaseBucket
-from cbcmgr.exceptions import APIError
+from cbcmgr.mt_window import TaskWindow
+from cbcmgr.ndjson_reader import NDJSONReader
+import cbcmgr.codec as codec
+from cbcmgr.exceptions import APIError, TaskError
+
+
+def load_worker_init(*counters):
+    rand.rand_seed()
+    rand.set_counters(*counters)
+
+
+def load_worker(params: dict,
+                bucket: str,
+                scope: str,
+                collection: str,
+                id_field: str,
+                template: dict,
+                id_key: str,
+                key_format: KeyStyle,
+                first: int,
+                last: int,
+                offset: int):
+    loop = MainLoop()
+    rand.prepare_template(template, reset=False)
+
+    try:
+        db = CBConnect(params['host'], params['username'], params['password'], ssl=params['tls'],
+                       project=params['project'],
+                       database=params['database']).connect(bucket, scope, collection)
+    except Exception as err:
+        raise TestRunError(f"can not connect to Couchbase: {err}")
+
+    return loop.load_range(db, id_field, key_format, id_key, first, last, offset, params['batch_size'], params['max_in_flight'], params['safe_mode'])
 
 
 class MainLoop(object):
@@ -92,7 +123,7 @@ class MainLoop(object):
                         if collection.override_count:
                             print(f"        Document Count: {collection.record_count}")
                         print(f"        Schema:")
-                        json_output = json.dumps(collection.schema, indent=2, cls=EnumEncoder)
+                        json_output = codec.dumps(collection.schema, indent=True)
                         lines = json_output.split('\n')
                         for line in lines:
                             print(f"               {line}")
@@ -190,13 +221,86 @@ class MainLoop(object):
                     collection.add_index_name(index_name)
                     self.logger.info(f"Created index {index_name} on {index}")
 
+    @staticmethod
+    def split_range(count: int, parts: int):
+        size, extra = divmod(count, parts)
+        first = 1
+        for n in range(parts):
+            last = first + size - 1 + (1 if n < extra else 0)
+            if last >= first:
+                yield first, last
+            first = last + 1
+
+    @staticmethod
+    def in_flight_limit(batch_size: int, max_in_flight: int = None):
+        return max_in_flight if max_in_flight else batch_size * 10
+
+    @staticmethod
+    def batch_window(batch_size: int, max_in_flight: int = None):
+        return max(1, MainLoop.in_flight_limit(batch_size, max_in_flight) // batch_size)
+
+    def load_range(self, db: CBConnect, id_field: str, key_format: KeyStyle, id_key: str, first: int, last: int, offset: int, batch_size: int, max_in_flight: int, safe_mode: bool):
+        batch_count = self.batch_window(batch_size, max_in_flight)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=batch_count)
+        db_op = DBWrite(db, id_field)
+
+        try:
+            with TaskWindow(executor, batch_count, keep_results=True) as window:
+                for n in range(first, last + 1, batch_size):
+                    documents = rand.process_template_batch(min(batch_size, last - n + 1))
+                    batch = {KeyFormat.key_format(key_format, document, db.collection_name, key + offset, id_key): document for key, document in enumerate(documents, start=n)}
+                    window.submit(db_op.execute_multi, batch, safe_mode)
+        except TaskError as err:
+            self.logger.error(f"task error: {err}")
+            raise TestRunError(str(err))
+        finally:
+            executor.shutdown()
+
+        inserted_total = sum(window.results)
+        return inserted_total, (last - first + 1) - inserted_total
+
+    def load_parallel(self, bucket: Bucket, scope: Scope, collection: Collection, schema: CollectionDoc, key_format: KeyStyle, operation_count: int, offset: int):
+        inserted_total = 0
+        skipped_total = 0
+        tasks = set()
+        params = dict(
+            host=config.host,
+            username=config.username,
+            password=config.password,
+            tls=config.tls,
+            project=config.capella_project,
+            database=config.capella_db,
+            batch_size=config.batch_size,
+            max_in_flight=config.max_in_flight,
+            safe_mode=config.safe_mode
+        )
+
+        self.logger.info(f"Generating data with {config.process_count} processes")
+        rand.share_indexes()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=config.process_count, mp_context=rand.mp_context, initializer=load_worker_init, initargs=rand.get_counters()) as executor:
+            for first, last in self.split_range(operation_count, config.process_count):
+                tasks.add(executor.submit(load_worker,
+                                          params,
+                                          bucket.name,
+                                          scope.name,
+                                          collection.name,
+                                          collection.idkey,
+                                          schema.doc,
+                                          schema.id_key,
+                                          key_format,
+                                          first,
+                                          last,
+                                          offset))
+            for inserted, skipped in self.task_wait(tasks):
+                inserted_total += inserted
+                skipped_total += skipped
+
+        return inserted_total, skipped_total
+
     def process(self, bucket: Bucket, scope: Scope, collection: Collection):
         last_batch = 0
         inserted_total = 0
-        skipped_count = 0
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.batch_size)
-        run_batch_size = config.batch_size * 10
-        tasks = set()
+        skipped_total = 0
         schema_list: List[CollectionDoc]
 
         if type(collection.schema) is list:
@@ -207,13 +311,6 @@ class MainLoop(object):
         for schema in schema_list:
             rand.prepare_template(schema.doc)
 
-            try:
-                db = CBConnect(config.host, config.username, config.password, ssl=config.tls,
-                               project=config.capella_project,
-                               database=config.capella_db).connect(bucket.name, scope.name, collection.name)
-            except Exception as err:
-                raise TestRunError(f"can not connect to Couchbase: {err}")
-
             if schema.override_count:
                 operation_count = schema.record_count
             else:
@@ -227,27 +324,25 @@ class MainLoop(object):
             else:
                 key_format = KeyStyle.DEFAULT
 
-            db_op = DBWrite(db, collection.idkey)
             self.logger.info(f"Inserting {operation_count} records into collection {collection.name}")
 
-            for n in range(1, operation_count + 1, run_batch_size):
-                tasks.clear()
-                inserted_count = 0
-                for key in range(n, n + run_batch_size):
-                    if key > operation_count:
-                        break
-                    document = rand.process_template()
-                    tasks.add(executor.submit(db_op.execute,
-                                              KeyFormat.key_format(key_format, document, db.collection_name, key + last_batch, schema.id_key),
-                                              document,
-                                              config.safe_mode))
-                    inserted_count += 1
-                results = self.task_wait(tasks)
-                inserted_total += len(results)
-                skipped_count = inserted_count - len(results)
+            if config.process_count > 1 and operation_count > 1:
+                inserted, skipped = self.load_parallel(bucket, scope, collection, schema, key_format, operation_count, last_batch)
+            else:
+                try:
+                    db = CBConnect(config.host, config.username, config.password, ssl=config.tls,
+                                   project=config.capella_project,
+                                   database=config.capella_db).connect(bucket.name, scope.name, collection.name)
+                except Exception as err:
+                    raise TestRunError(f"can not connect to Couchbase: {err}")
+
+                inserted, skipped = self.load_range(db, collection.idkey, key_format, schema.id_key, 1, operation_count, last_batch, config.batch_size, config.max_in_flight, config.safe_mode)
+
+            inserted_total += inserted
+            skipped_total += skipped
             last_batch += operation_count
 
-        self.logger.info(f"Inserted {inserted_total} skipped {skipped_count}")
+        self.logger.info(f"Inserted {inserted_total} skipped {skipped_total}")
 
     def post_process(self, bucket: Bucket, scope: Scope, collection: Collection):
         pass
@@ -278,12 +373,10 @@ class MainLoop(object):
         db_op.execute()
 
     def input_load(self):
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.batch_size)
-        decoder = json.JSONDecoder()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.batch_window(config.batch_size, config.max_in_flight))
         bucket = config.bucket_name
         scope = config.scope_name
         collection = config.collection_name
-        tasks = set()
 
         self.logger.info(f"Inserting records into collection {collection}")
 
@@ -296,37 +389,36 @@ class MainLoop(object):
             raise TestRunError(f"can not connect to Couchbase: {err}")
 
         if config.insert_data:
-            content = io.StringIO(config.insert_data)
+            content = io.BytesIO(config.insert_data.encode('utf-8'))
         else:
-            content = sys.stdin
+            content = sys.stdin.buffer
 
         count = db.collection_count()
 
-        object_count = 0
         key_count = count
-        buffer = ''
-        for chunk in iter(partial(content.read, 131072), ''):
-            tasks.clear()
-            buffer += chunk
-            while buffer:
-                try:
-                    json_object, position = decoder.raw_decode(buffer)
-                    db_op = DBWrite(db)
-                    key_count += 1
-                    if config.key_field in json_object:
-                        doc_key = json_object[config.key_field]
-                    else:
-                        doc_key = key_count
-                    document = dict(json_object).copy()
-                    tasks.add(executor.submit(db_op.execute, str(doc_key), document, False))
-                    object_count += 1
-                    buffer = buffer[position:]
-                    buffer = buffer.lstrip()
-                except ValueError:
-                    break
-            self.task_wait(tasks)
-
-        self.logger.info(f"Collection had {count} documents - inserted {object_count} additional record(s)")
+        db_op = DBWrite(db)
+        reader = NDJSONReader(iter(partial(content.read, 131072), b''), batch_size=config.batch_size)
+        try:
+            with TaskWindow(executor, self.batch_window(config.batch_size, config.max_in_flight)) as window:
+                for objects in reader.batches():
+                    batch = {}
+                    for json_object in objects:
+                        key_count += 1
+                        if config.key_field in json_object:
+                            doc_key = json_object[config.key_field]
+                        else:
+                            doc_key = key_count
+                        batch[str(doc_key)] = json_object
+                    window.submit(db_op.execute_multi, batch, False)
+        except TaskError as err:
+            self.logger.error(f"task error: {err}")
+            raise TestRunError(str(err))
+        finally:
+            executor.shutdown()
+
+        if reader.errors:
+            self.logger.warning(f"Skipped {reader.errors} record(s) that could not be decoded")
+        self.logger.info(f"Collection had {count} documents - inserted {reader.count} additional record(s)")
 
     def read(self):
         bucket = config.bucket_name
@@ -356,8 +448,8 @@ class MainLoop(object):
             if not db_op.result:
                 break
             try:
-                output = json.dumps(db_op.result, indent=2)
-            except json.decoder.JSONDecodeError:
+                output = codec.dumps(db_op.result, indent=True)
+            except TypeError:
                 output = db_op.result
             print(output)
             if n == 0:
@@ -372,7 +464,7 @@ class MainLoop(object):
         for meta_id in query_op.result:
             db_op.execute(meta_id['id'])
             try:
-                output = json.dumps(db_op.result, indent=2)
-            except json.decoder.JSONDecodeError:
+                output = codec.dumps(db_op.result, indent=True)
+            except TypeError:
                 output = db_op.result
             print(output)
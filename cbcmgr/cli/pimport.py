@@ -2,25 +2,78 @@
 ##
 
 import logging
-import json
 import time
+import queue
+import base64
+import threading
 import concurrent.futures
+from enum import Enum
+from uuid import UUID
+from decimal import Decimal
 from cbcmgr.cli.relational import Schema, Table
-from datetime import date, datetime
+from datetime import datetime, date, time as dt_time, timedelta
 from cbcmgr.cb_connect import CBConnect
 import cbcmgr.cli.config as config
 from cbcmgr.cli.exceptions import PluginImportError
 from cbcmgr.cli.main import MainLoop
 from cbcmgr.cli.exec_step import DBWrite
+from cbcmgr.mt_window import TaskWindow
+
+native_types = (str, int, float, bool, type(None))
+
+
+def map_row(row: dict) -> dict:
+    return {key: map_value(value) for key, value in row.items()}
+
+
+def map_list(values) -> list:
+    return [map_value(value) for value in values]
+
+
+def map_bytes(value) -> str:
+    return base64.b64encode(bytes(value)).decode('ascii')
+
+
+type_map = {
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    dt_time: dt_time.isoformat,
+    timedelta: lambda v: int(v.total_seconds()),
+    Decimal: float,
+    UUID: str,
+    Enum: lambda v: v.value,
+    bytes: map_bytes,
+    bytearray: map_bytes,
+    memoryview: map_bytes,
+    dict: map_row,
+    list: map_list,
+    tuple: map_list,
+    set: map_list,
+    frozenset: map_list,
+}
+type_cache = {}
+type_cache_lock = threading.Lock()
+
+
+def map_value(value):
+    if isinstance(value, native_types):
+        return value
+    converter = type_map.get(type(value)) or type_cache.get(type(value))
+    if not converter:
+        converter = next((fn for t, fn in type_map.items() if isinstance(value, t)), str)
+        with type_cache_lock:
+            type_cache[type(value)] = converter
+    return converter(value)
 
 
 class PluginImport(object):
 
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
-        module = __import__(f"lib.plugins.{config.plugin_name}", fromlist=['*'])
-        self.plugin = module.DBDriver(config.plugin_vars)
+        self.module = __import__(f"lib.plugins.{config.plugin_name}", fromlist=['*'])
+        self.plugin = self.module.DBDriver(config.plugin_vars)
         self.schema = None
+        self.stop = threading.Event()
 
     def get_schema(self):
         self.schema: Schema = self.plugin.get_schema()
@@ -28,21 +81,95 @@ class PluginImport(object):
     def get_table(self, table: Table):
         pass
 
-    @staticmethod
-    def json_serial(obj):
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        raise TypeError("Type %s not serializable" % type(obj))
+    def table_driver(self):
+        if config.table_parallel > 1:
+            return self.module.DBDriver(config.plugin_vars)
+        return self.plugin
 
     @staticmethod
     def calc_mem_quota(n: int):
         return 1024 * round(n*4/1024)
 
-    def import_tables(self):
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.batch_size)
+    def prep_table(self, table: Table, bucket_mem_quota: int):
         bucket = config.bucket_name
         scope = config.scope_name
-        tasks = set()
+        collection = table.name
+        self.logger.info(f"Processing table {table.name}")
+
+        table_index_columns = self.plugin.get_table_indexes(table.name)
+
+        try:
+            self.logger.info(f"Creating collection {collection}")
+            dbm = MainLoop().prep_bucket(bucket, scope, collection, bucket_mem_quota)
+            if len(table_index_columns) > 0:
+                for column in table_index_columns:
+                    self.logger.info(f"Creating index on {column}")
+                    index_name = dbm.cb_create_index(fields=[column], replica=config.replicas)
+                    if not index_name:
+                        self.logger.info(f"Index already exists")
+                    else:
+                        self.logger.info(f"Created index {index_name}")
+            return CBConnect(config.host, config.username, config.password, ssl=config.tls).connect(bucket, scope, collection)
+        except Exception as err:
+            raise PluginImportError(f"can not connect to Couchbase: {err}")
+
+    def read_table(self, table: Table, q: queue.Queue):
+        key_count = 0
+        batch = {}
+        try:
+            for row in self.table_driver().get_table(table):
+                if self.stop.is_set():
+                    return
+                key_count += 1
+                batch[key_count] = map_row(row)
+                if len(batch) >= config.batch_size:
+                    q.put(batch)
+                    batch = {}
+            if batch:
+                q.put(batch)
+        except Exception as err:
+            self.logger.debug(f"table {table.name} read error: {type(err).__name__}: {err}")
+            q.put(err)
+        finally:
+            q.put(None)
+
+    def import_table(self, table: Table, db: CBConnect, executor: concurrent.futures.Executor, batch_count: int):
+        start_time = time.perf_counter()
+        q = queue.Queue(maxsize=batch_count * 2)
+        reader = threading.Thread(target=self.read_table, args=(table, q))
+        reader.start()
+
+        self.logger.info(f"Copying {table.rows:,} row(s) of table {table.name} to Couchbase (this step may take some time)")
+        db_op = DBWrite(db)
+        key_count = 0
+        try:
+            with TaskWindow(executor, batch_count) as window:
+                while True:
+                    batch = q.get()
+                    if batch is None:
+                        break
+                    if isinstance(batch, Exception):
+                        raise batch
+                    key_count += len(batch)
+                    window.submit(db_op.execute_multi, batch)
+        except BaseException:
+            self.stop.set()
+            raise
+        finally:
+            while reader.is_alive():
+                try:
+                    q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            reader.join()
+
+        end_time = time.perf_counter()
+        run_time = time.strftime("%H hours %M minutes %S seconds", time.gmtime(end_time - start_time))
+        self.logger.info(f"Table {table.name} complete in {run_time}")
+        return key_count
+
+    def import_tables(self):
+        batch_count = MainLoop.batch_window(config.batch_size, config.max_in_flight)
 
         self.logger.info(f"Retrieving schema information")
         self.get_schema()
@@ -57,55 +184,29 @@ class PluginImport(object):
         time_string = now.strftime("%D %I:%M:%S %p")
         self.logger.info(f"Import started at {time_string}")
 
-        for table in self.schema.tables:
-            start_time = time.perf_counter()
-            collection = table.name
-            self.logger.info(f"Processing table {table.name}")
-
-            table_index_columns = self.plugin.get_table_indexes(table.name)
-
-            try:
-                self.logger.info(f"Creating collection {collection}")
-                dbm = MainLoop().prep_bucket(bucket, scope, collection, bucket_mem_quota)
-                if len(table_index_columns) > 0:
-                    for column in table_index_columns:
-                        self.logger.info(f"Creating index on {column}")
-                        index_name = dbm.cb_create_index(fields=[column], replica=config.replicas)
-                        if not index_name:
-                            self.logger.info(f"Index already exists")
-                        else:
-                            self.logger.info(f"Created index {index_name}")
-                db = CBConnect(config.host, config.username, config.password, ssl=config.tls).connect(bucket, scope, collection)
-            except Exception as err:
-                raise PluginImportError(f"can not connect to Couchbase: {err}")
-
-            self.logger.info(f"Copying {table.rows:,} row(s) of table data to Couchbase (this step may take some time)")
-            db_op = DBWrite(db)
-            key_count = 0
-            iteration_count = 0
-            tasks.clear()
-            for row in self.plugin.get_table(table):
-                row_json = json.dumps(row, indent=2, default=self.json_serial)
-                document = json.loads(row_json)
-                key_count += 1
-                tasks.add(executor.submit(db_op.execute, key_count, document))
-                iteration_count += 1
-                if iteration_count >= config.batch_size:
-                    MainLoop().task_wait(tasks)
-                    tasks.clear()
-                    iteration_count = 0
-
-            MainLoop().task_wait(tasks)
-            tasks.clear()
-
-            if table.rows != key_count:
-                self.logger.warning(f"Actual rows {key_count} doesn't equal expected count {table.rows}")
-            else:
-                self.logger.info("All rows imported")
-
-            end_time = time.perf_counter()
-            run_time = time.strftime("%H hours %M minutes %S seconds", time.gmtime(end_time - start_time))
-            self.logger.info(f"Table complete in {run_time}")
+        tables = [(table, self.prep_table(table, bucket_mem_quota)) for table in self.schema.tables]
+
+        write_executor = concurrent.futures.ThreadPoolExecutor(max_workers=batch_count)
+        table_executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.table_parallel)
+        try:
+            tasks = {table_executor.submit(self.import_table, table, db, write_executor, batch_count): table for table, db in tables}
+            for task in concurrent.futures.as_completed(tasks):
+                table = tasks[task]
+                try:
+                    key_count = task.result()
+                except Exception as err:
+                    self.stop.set()
+                    for pending in tasks:
+                        pending.cancel()
+                    raise PluginImportError(f"table {table.name} import failed: {err}")
+
+                if table.rows != key_count:
+                    self.logger.warning(f"Table {table.name}: actual rows {key_count} doesn't equal expected count {table.rows}")
+                else:
+                    self.logger.info(f"Table {table.name}: all rows imported")
+        finally:
+            table_executor.shutdown()
+            write_executor.shutdown()
 
         now = datetime.now()
         time_string = now.strftime("%D %I:%M:%S %p")
@@ -7,9 +7,10 @@ import multiprocessing
 import random
 import re
 import io
-from jinja2 import Template
+import zlib
+import calendar
+from typing import Callable, Union, Sequence
 from jinja2.environment import Environment
-from jinja2.runtime import DebugUndefined
 from jinja2.meta import find_undeclared_variables
 from datetime import datetime, timedelta
 from cbcmgr.cli.exceptions import ConfigFileError
@@ -21,6 +22,7 @@ from PIL import Image
 from cbcmgr import get_config_file
 
 warnings.filterwarnings("ignore")
+mp_context = multiprocessing.get_context('spawn')
 
 
 class HashMode(Enum):
@@ -61,9 +63,9 @@ class FastRandom(object):
 class MPAtomicIncrement(object):
 
     def __init__(self, i=1, s=1):
-        self.count = multiprocessing.Value('i', i)
+        self.count = mp_context.Value('i', i)
         self._set_size = s
-        self.set_count = multiprocessing.Value('i', s)
+        self.set_count = mp_context.Value('i', s)
 
     def reset(self, i=1):
         with self.count.get_lock():
@@ -95,17 +97,86 @@ class MPAtomicIncrement(object):
             return self.count.value
 
 
+class UniqueIndex(object):
+
+    def __init__(self, size: int = 0):
+        self.counts = {}
+        self.shared = mp_context.Array('i', size) if size else None
+
+    def next(self, prefix: str) -> int:
+        if self.shared is None:
+            count = self.counts.get(prefix, 0)
+            self.counts[prefix] = count + 1
+            return count
+        slot = zlib.crc32(prefix.encode('utf-8')) % len(self.shared)
+        with self.shared.get_lock():
+            count = self.shared[slot]
+            self.shared[slot] = count + 1
+        return count
+
+    def unique(self, prefix: str) -> str:
+        count = self.next(prefix)
+        return prefix + str(count) if count > 0 else prefix
+
+
+class UniqueSequence(object):
+    rounds = 4
+
+    def __init__(self, limit: int, shared: bool = False):
+        self.limit = limit
+        bits = (limit - 1).bit_length()
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        self.keys = [random.getrandbits(32) for _ in range(self.rounds)]
+        self.count = mp_context.Value('q', 0) if shared else None
+        self.local_count = 0
+
+    def reserve(self, n: int) -> int:
+        if self.count is None:
+            start = self.local_count
+            self.local_count += n
+            return start
+        with self.count.get_lock():
+            start = self.count.value
+            self.count.value += n
+        return start
+
+    def permute(self, value):
+        left = value >> self.half
+        right = value & self.mask
+        for key in self.keys:
+            mix = right * 0x9E3779B1 + key
+            left, right = right, left ^ ((mix ^ (mix >> 13)) & self.mask)
+        return (left << self.half) | right
+
+    def value(self, index: int) -> int:
+        value = self.permute(index % self.limit)
+        while value >= self.limit:
+            value = self.permute(value)
+        return value
+
+    def next(self) -> int:
+        return self.value(self.reserve(1))
+
+    def take(self, n: int) -> numpy.ndarray:
+        start = self.reserve(n)
+        values = self.permute(numpy.arange(start, start + n, dtype=numpy.int64) % self.limit)
+        walk = values >= self.limit
+        while walk.any():
+            values[walk] = self.permute(values[walk])
+            walk = values >= self.limit
+        return values
+
+
 data_file_name = get_config_file('data.json')
 data_struct = {}
-issued_struct = {
-    "ssn": {},
-    "username": {},
-    "email": {},
-    "nickname": {}
-}
+ssn_sequence = UniqueSequence(10 ** 9)
+nickname_index = UniqueIndex()
+email_index = UniqueIndex()
+username_index = UniqueIndex()
 requested_tags = None
 template = None
-compiled: Template
+compiled: Callable
 password_hash = HashMode.sha1.value
 incrementor = MPAtomicIncrement()
 incrementor_block = MPAtomicIncrement(s=10)
@@ -120,6 +191,7 @@ def load_data() -> None:
             data_struct = json.load(data_file)
     except Exception as err:
         raise ConfigFileError(f"can not read random data file: {err}")
+    batch_random.arrays.clear()
 
 
 def random_number_seq(n):
@@ -221,12 +293,12 @@ def credit_card():
     return re.sub('X', random_match, card_mask)
 
 
+def ssn_format(value: int):
+    return f"{value // 1000000:03d}-{value // 10000 % 100:02d}-{value % 10000:04d}"
+
+
 def social_security_number():
-    while True:
-        issued = '-'.join([random_number_seq(3), random_number_seq(2), random_number_seq(4)])
-        if not issued_struct['ssn'].get(issued):
-            issued_struct['ssn'].update({issued: None})
-            return issued
+    return ssn_format(ssn_sequence.next())
 
 
 def three_digits():
@@ -416,30 +488,15 @@ def date_iso_30():
 
 
 def nick_name(first_name="John", last_name="Doe"):
-    name = first_name[0].lower() + last_name.lower()
-    found = [issued_struct['nickname'][key] for key in issued_struct['nickname'] if re.match(f"^{name}", key)]
-    if len(found) > 0:
-        suffix = str(len(found))
-        name += suffix
-    return name
+    return nickname_index.unique(first_name[0].lower() + last_name.lower())
 
 
 def email_address(first_name="John", last_name="Doe"):
-    mailbox = first_name.lower() + '.' + last_name.lower()
-    found = [issued_struct['email'][key] for key in issued_struct['email'] if re.match(f"^{mailbox}", key)]
-    if len(found) > 0:
-        suffix = str(len(found))
-        mailbox += suffix
-    return mailbox + '@example.com'
+    return email_index.unique(first_name.lower() + '.' + last_name.lower()) + '@example.com'
 
 
 def user_name(first_name="John", last_name="Doe"):
-    user = first_name.lower() + last_name.lower()
-    found = [issued_struct['username'][key] for key in issued_struct['username'] if re.match(f"^{user}", key)]
-    if len(found) > 0:
-        suffix = str(len(found))
-        user += suffix
-    return user
+    return username_index.unique(first_name.lower() + last_name.lower())
 
 
 def rand_image():
@@ -466,74 +523,428 @@ def rand_password():
     return base64.b64encode(digest).decode('utf-8')
 
 
+class RandomBatch(object):
+    hash_table = numpy.array([(ord('0') if b < 85 else ord('A') if b < 170 else ord('a')) + b % (10 if b < 85 else 26) for b in range(256)], dtype=numpy.uint8)
+    month_days = numpy.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    month_abbr = list(calendar.month_abbr)
+
+    def __init__(self, seed=None):
+        self.rng = numpy.random.default_rng(seed)
+        self.arrays = {}
+
+    def seed(self, seed=None):
+        self.rng = numpy.random.default_rng(seed)
+
+    def data_array(self, *path: str):
+        key = '.'.join(path)
+        values = self.arrays.get(key)
+        if values is None:
+            data = data_struct
+            for element in path:
+                data = data.get(element, {})
+            if not data:
+                raise ConfigFileError(f"No random {key} data")
+            values = numpy.array(data, dtype=object)
+            self.arrays[key] = values
+        return values
+
+    def choice(self, n: int, *path: str):
+        values = self.data_array(*path)
+        return values[self.rng.integers(0, len(values), n)].tolist()
+
+    def digits(self, n: int, width: int):
+        return [f"{v:0{width}d}" for v in self.rng.integers(0, 10 ** width, n).tolist()]
+
+    def random_hash(self, n: int, width: int):
+        raw = self.rng.integers(0, 256, (n, width), dtype=numpy.uint8)
+        return [v.decode('utf-8') for v in self.hash_table[raw].view(f"S{width}").ravel().tolist()]
+
+    def three_digits(self, n: int):
+        return self.digits(n, 3)
+
+    def four_digits(self, n: int):
+        return self.digits(n, 4)
+
+    def zip_code(self, n: int):
+        return self.digits(n, 5)
+
+    def account_number(self, n: int):
+        return self.digits(n, 10)
+
+    def numeric_sequence(self, n: int):
+        return self.digits(n, 16)
+
+    def hash_code(self, n: int):
+        return self.random_hash(n, 16)
+
+    def dollar_amount(self, n: int):
+        whole = self.rng.integers(1, 10 ** self.rng.integers(1, 6, n))
+        cents = self.rng.integers(0, 100, n)
+        return [f"{w}.{c:02d}" for w, c in zip(whole.tolist(), cents.tolist())]
+
+    def boolean_value(self, n: int):
+        return self.rng.integers(0, 2, n).astype(bool).tolist()
+
+    def year_value(self, n: int):
+        return [str(v) for v in (self.rng.integers(0, 100, n) + 1920).tolist()]
+
+    def month_number(self, n: int):
+        return [str(v) for v in self.rng.integers(1, 13, n).tolist()]
+
+    def month_value(self, n: int):
+        return [f"{v:02d}" for v in self.rng.integers(1, 13, n).tolist()]
+
+    def day_value(self, months: Sequence[str]):
+        limit = self.month_days[numpy.array(months, dtype=int)]
+        return [f"{v:02d}" for v in self.rng.integers(1, limit + 1).tolist()]
+
+    def past_date(self, n: int):
+        today = numpy.datetime64(datetime.today().date(), 'D')
+        return today - self.rng.integers(0, 4096, n).astype('timedelta64[D]')
+
+    def dob_date(self, n: int):
+        today = numpy.datetime64(datetime.today().date(), 'D')
+        return today - (self.rng.integers(0, 16384, n) + 7280).astype('timedelta64[D]')
+
+    @staticmethod
+    def past_date_slash(dates: numpy.ndarray):
+        return [f"{d[5:7]}/{d[8:10]}/{d[:4]}" for d in numpy.datetime_as_string(dates).tolist()]
+
+    @staticmethod
+    def past_date_hyphen(dates: numpy.ndarray):
+        return [f"{d[5:7]}-{d[8:10]}-{d[:4]}" for d in numpy.datetime_as_string(dates).tolist()]
+
+    @staticmethod
+    def past_date_text(dates: numpy.ndarray):
+        return [f"{RandomBatch.month_abbr[int(d[5:7])]} {d[8:10]} {d[:4]}" for d in numpy.datetime_as_string(dates).tolist()]
+
+    def date_iso(self, n: int, bits: int):
+        now = numpy.datetime64(datetime.today(), 'us')
+        return numpy.datetime_as_string(now - self.rng.integers(0, 2 ** bits, n).astype('timedelta64[s]'), unit='us').tolist()
+
+    def date_iso_7(self, n: int):
+        return self.date_iso(n, 20)
+
+    def date_iso_30(self, n: int):
+        return self.date_iso(n, 22)
+
+    @staticmethod
+    def date_code(n: int):
+        return [date_code() for _ in range(n)]
+
+    def rand_gender(self, n: int):
+        return self.rng.integers(0, 2, n)
+
+    def rand_first_name(self, g: Union[Gender, Sequence[int]], n: int):
+        if isinstance(g, Gender):
+            return self.choice(n, 'first_names', 'male' if g == Gender.M else 'female')
+        male = self.data_array('first_names', 'male')
+        female = self.data_array('first_names', 'female')
+        is_male = numpy.asarray(g) == Gender.M.value
+        male_count = int(is_male.sum())
+        names = numpy.empty(n, dtype=object)
+        names[is_male] = male[self.rng.integers(0, len(male), male_count)]
+        names[~is_male] = female[self.rng.integers(0, len(female), n - male_count)]
+        return names.tolist()
+
+    def rand_last_name(self, n: int):
+        return self.choice(n, 'last_names')
+
+    def rand_street_name(self, n: int):
+        return self.choice(n, 'street_names')
+
+    def rand_street_suffix(self, n: int):
+        return self.choice(n, 'street_suffix')
+
+    def rand_city(self, n: int):
+        return self.choice(n, 'city_names')
+
+    def rand_state(self, n: int):
+        return self.choice(n, 'state_names_short')
+
+    def rand_franchise(self, n: int):
+        return self.choice(n, 'franchises')
+
+    def rand_corporation(self, n: int):
+        return self.choice(n, 'corporations')
+
+    def address_line(self, n: int):
+        numbers = self.rng.integers(1, 10000, n).tolist()
+        return [f"{a} {b} {c}" for a, b, c in zip(numbers, self.rand_street_name(n), self.rand_street_suffix(n))]
+
+    def phone_number(self, n: int):
+        nxx = self.rng.integers(2, 10, n) * 100 + self.rng.integers(0, 100, n)
+        line = self.rng.integers(0, 10000, n)
+        return [f"{a}-{b}-{c:04d}" for a, b, c in zip(self.choice(n, 'area_codes'), nxx.tolist(), line.tolist())]
+
+    def credit_card(self, n: int):
+        masks = self.choice(n, 'card_masks')
+        width = max(mask.count('X') for mask in masks)
+        raw = self.rng.integers(ord('0'), ord('9') + 1, (n, width), dtype=numpy.uint8)
+        numbers = [v.decode('utf-8') for v in raw.view(f"S{width}").ravel().tolist()]
+        return [mask.replace('X', '{}').format(*number) for mask, number in zip(masks, numbers)]
+
+    @staticmethod
+    def social_security_number(n: int):
+        return [ssn_format(value) for value in ssn_sequence.take(n).tolist()]
+
+    @staticmethod
+    def nick_name(first_names: Sequence[str], last_names: Sequence[str]):
+        return [nick_name(f, l) for f, l in zip(first_names, last_names)]
+
+    @staticmethod
+    def email_address(first_names: Sequence[str], last_names: Sequence[str]):
+        return [email_address(f, l) for f, l in zip(first_names, last_names)]
+
+    @staticmethod
+    def user_name(first_names: Sequence[str], last_names: Sequence[str]):
+        return [user_name(f, l) for f, l in zip(first_names, last_names)]
+
+    @staticmethod
+    def rand_image(n: int):
+        return [rand_image() for _ in range(n)]
+
+    @staticmethod
+    def rand_password(n: int):
+        return [rand_password()] * n
+
+
+batch_random = RandomBatch()
+
+
 def rand_init():
     load_data()
 
 
-def prepare_template(json_block):
+def rand_seed():
+    random.seed()
+    numpy.random.seed()
+    batch_random.seed()
+
+
+def share_indexes(size: int = 1 << 20):
+    global ssn_sequence, nickname_index, email_index, username_index
+    if ssn_sequence.count is not None:
+        return
+    ssn_sequence = UniqueSequence(10 ** 9, shared=True)
+    nickname_index = UniqueIndex(size)
+    email_index = UniqueIndex(size)
+    username_index = UniqueIndex(size)
+
+
+def get_counters():
+    return incrementor, incrementor_block, region_block, ssn_sequence, nickname_index, email_index, username_index
+
+
+def set_counters(incr_value: MPAtomicIncrement,
+                 incr_block: MPAtomicIncrement,
+                 region: MPAtomicIncrement,
+                 ssn: UniqueSequence,
+                 nickname: UniqueIndex,
+                 email: UniqueIndex,
+                 username: UniqueIndex):
+    global incrementor, incrementor_block, region_block, ssn_sequence, nickname_index, email_index, username_index
+    incrementor = incr_value
+    incrementor_block = incr_block
+    region_block = region
+    ssn_sequence = ssn
+    nickname_index = nickname
+    email_index = email
+    username_index = username
+
+
+class TemplateContext(dict):
+
+    def __missing__(self, key):
+        generator = tag_map.get(key)
+        if not generator:
+            return ''
+        value = generator(self)
+        self[key] = value
+        return value
+
+
+tag_map = {
+    "_gender": lambda c: rand_gender(),
+    "_first": lambda c: rand_first_name(c['_gender']),
+    "_last": lambda c: rand_last_name(),
+    "_past_date": lambda c: past_date(),
+    "_dob_date": lambda c: dob_date(),
+    "_month": lambda c: month_number(),
+    "date_time": lambda c: date_code(),
+    "incr_value": lambda c: incrementor.next,
+    "incr_block": lambda c: incrementor_block.next,
+    "region_name": lambda c: Region(region_block.next % 3).name,
+    "rand_credit_card": lambda c: credit_card(),
+    "rand_ssn": lambda c: social_security_number(),
+    "rand_four": lambda c: four_digits(),
+    "rand_account": lambda c: account_number(),
+    "rand_id": lambda c: numeric_sequence(),
+    "rand_zip_code": lambda c: zip_code(),
+    "rand_dollar": lambda c: dollar_amount(),
+    "rand_hash": lambda c: hash_code(),
+    "rand_address": lambda c: address_line(),
+    "rand_city": lambda c: rand_city(),
+    "rand_state": lambda c: rand_state(),
+    "rand_first": lambda c: c['_first'],
+    "rand_last": lambda c: c['_last'],
+    "rand_nickname": lambda c: nick_name(c['_first'], c['_last']),
+    "rand_email": lambda c: email_address(c['_first'], c['_last']),
+    "rand_username": lambda c: user_name(c['_first'], c['_last']),
+    "rand_phone": lambda c: phone_number(),
+    "rand_bool": lambda c: boolean_value(),
+    "rand_year": lambda c: year_value(),
+    "rand_month": lambda c: c['_month'],
+    "rand_day": lambda c: day_value(c['_month']),
+    "rand_franchise": lambda c: rand_franchise(),
+    "rand_corporation": lambda c: rand_corporation(),
+    "date_iso_week": lambda c: date_iso_7(),
+    "date_iso_month": lambda c: date_iso_30(),
+    "rand_date_1": lambda c: past_date_slash(c['_past_date']),
+    "rand_date_2": lambda c: past_date_hyphen(c['_past_date']),
+    "rand_date_3": lambda c: past_date_text(c['_past_date']),
+    "rand_dob_1": lambda c: dob_slash(c['_dob_date']),
+    "rand_dob_2": lambda c: dob_hyphen(c['_dob_date']),
+    "rand_dob_3": lambda c: dob_text(c['_dob_date']),
+    "rand_image": lambda c: rand_image(),
+    "rand_password": lambda c: rand_password(),
+}
+
+
+class BatchContext(dict):
+
+    def __init__(self, size: int):
+        super().__init__()
+        self.size = size
+
+    def __missing__(self, key):
+        generator = batch_tag_map.get(key)
+        if not generator:
+            value = [''] * self.size
+        else:
+            value = generator(self)
+        self[key] = value
+        return value
+
+
+class RowContext(object):
+
+    def __init__(self, batch: BatchContext, index: int):
+        self.batch = batch
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.batch[key][self.index]
+
+
+batch_tag_map = {
+    "_gender": lambda c: batch_random.rand_gender(c.size),
+    "_first": lambda c: batch_random.rand_first_name(c['_gender'], c.size),
+    "_last": lambda c: batch_random.rand_last_name(c.size),
+    "_past_date": lambda c: batch_random.past_date(c.size),
+    "_dob_date": lambda c: batch_random.dob_date(c.size),
+    "_month": lambda c: batch_random.month_number(c.size),
+    "date_time": lambda c: batch_random.date_code(c.size),
+    "incr_value": lambda c: [incrementor.next for _ in range(c.size)],
+    "incr_block": lambda c: [incrementor_block.next for _ in range(c.size)],
+    "region_name": lambda c: [Region(region_block.next % 3).name for _ in range(c.size)],
+    "rand_credit_card": lambda c: batch_random.credit_card(c.size),
+    "rand_ssn": lambda c: batch_random.social_security_number(c.size),
+    "rand_four": lambda c: batch_random.four_digits(c.size),
+    "rand_account": lambda c: batch_random.account_number(c.size),
+    "rand_id": lambda c: batch_random.numeric_sequence(c.size),
+    "rand_zip_code": lambda c: batch_random.zip_code(c.size),
+    "rand_dollar": lambda c: batch_random.dollar_amount(c.size),
+    "rand_hash": lambda c: batch_random.hash_code(c.size),
+    "rand_address": lambda c: batch_random.address_line(c.size),
+    "rand_city": lambda c: batch_random.rand_city(c.size),
+    "rand_state": lambda c: batch_random.rand_state(c.size),
+    "rand_first": lambda c: c['_first'],
+    "rand_last": lambda c: c['_last'],
+    "rand_nickname": lambda c: batch_random.nick_name(c['_first'], c['_last']),
+    "rand_email": lambda c: batch_random.email_address(c['_first'], c['_last']),
+    "rand_username": lambda c: batch_random.user_name(c['_first'], c['_last']),
+    "rand_phone": lambda c: batch_random.phone_number(c.size),
+    "rand_bool": lambda c: batch_random.boolean_value(c.size),
+    "rand_year": lambda c: batch_random.year_value(c.size),
+    "rand_month": lambda c: c['_month'],
+    "rand_day": lambda c: batch_random.day_value(c['_month']),
+    "rand_franchise": lambda c: batch_random.rand_franchise(c.size),
+    "rand_corporation": lambda c: batch_random.rand_corporation(c.size),
+    "date_iso_week": lambda c: batch_random.date_iso_7(c.size),
+    "date_iso_month": lambda c: batch_random.date_iso_30(c.size),
+    "rand_date_1": lambda c: batch_random.past_date_slash(c['_past_date']),
+    "rand_date_2": lambda c: batch_random.past_date_hyphen(c['_past_date']),
+    "rand_date_3": lambda c: batch_random.past_date_text(c['_past_date']),
+    "rand_dob_1": lambda c: batch_random.past_date_slash(c['_dob_date']),
+    "rand_dob_2": lambda c: batch_random.past_date_hyphen(c['_dob_date']),
+    "rand_dob_3": lambda c: batch_random.past_date_text(c['_dob_date']),
+    "rand_image": lambda c: batch_random.rand_image(c.size),
+    "rand_password": lambda c: batch_random.rand_password(c.size),
+}
+
+tag_pattern = re.compile(r"{{\s*([A-Za-z_][A-Za-z0-9_]*)\s*}}")
+
+
+def compile_string(value: str, env: Environment, tags: set):
+    if '{{' not in value and '{%' not in value and '{#' not in value:
+        return lambda c: value
+
+    parts = tag_pattern.split(value)
+    literals = parts[0::2]
+    names = parts[1::2]
+
+    if '{%' in value or '{#' in value or any('{{' in literal or '}}' in literal for literal in literals):
+        t = env.from_string(value)
+        variables = find_undeclared_variables(env.parse(value))
+        known = [name for name in variables if name in tag_map]
+        tags.update(variables)
+        return lambda c: t.render({name: c[name] for name in known})
+
+    tags.update(names)
+
+    if len(names) == 1 and not literals[0] and not literals[1]:
+        name = names[0]
+        return lambda c: str(c[name])
+
+    def render(c):
+        output = [literals[0]]
+        for name, literal in zip(names, literals[1:]):
+            output.append(str(c[name]))
+            output.append(literal)
+        return ''.join(output)
+
+    return render
+
+
+def compile_block(block, env: Environment, tags: set):
+    if isinstance(block, dict):
+        items = [(compile_string(key, env, tags) if isinstance(key, str) else (lambda c, k=key: k), compile_block(value, env, tags)) for key, value in block.items()]
+        return lambda c: {key(c): value(c) for key, value in items}
+    elif isinstance(block, list):
+        elements = [compile_block(value, env, tags) for value in block]
+        return lambda c: [value(c) for value in elements]
+    elif isinstance(block, str):
+        return compile_string(block, env, tags)
+    else:
+        return lambda c: block
+
+
+def prepare_template(json_block, reset: bool = True):
     global requested_tags, template, compiled, incrementor
-    incrementor.reset()
-    block_string = json.dumps(json_block)
-    env = Environment(undefined=DebugUndefined)
-    t = env.from_string(block_string)
-    rendered = t.render()
-    ast = env.parse(rendered)
-    requested_tags = find_undeclared_variables(ast)
-    template = block_string
-    compiled = Template(template)
+    if reset:
+        incrementor.reset()
+    tags = set()
+    env = Environment()
+    template = json_block
+    compiled = compile_block(json_block, env, tags)
+    requested_tags = tags
 
 
 def process_template():
-    global compiled
-    g = rand_gender()
-    first_name = rand_first_name(g)
-    last_name = rand_last_name()
-    _past_date = past_date()
-    _dob_date = dob_date()
-    month = month_number()
-    random_image = None
-
-    if 'rand_image' in requested_tags:
-        random_image = rand_image()
-
-    formatted_block = compiled.render(date_time=date_code(),
-                                      incr_value=incrementor.next,
-                                      incr_block=incrementor_block.next,
-                                      region_name=Region(region_block.next % 3).name,
-                                      rand_credit_card=credit_card(),
-                                      rand_ssn=social_security_number(),
-                                      rand_four=four_digits(),
-                                      rand_account=account_number(),
-                                      rand_id=numeric_sequence(),
-                                      rand_zip_code=zip_code(),
-                                      rand_dollar=dollar_amount(),
-                                      rand_hash=hash_code(),
-                                      rand_address=address_line(),
-                                      rand_city=rand_city(),
-                                      rand_state=rand_state(),
-                                      rand_first=first_name,
-                                      rand_last=last_name,
-                                      rand_nickname=nick_name(first_name, last_name),
-                                      rand_email=email_address(first_name, last_name),
-                                      rand_username=user_name(first_name, last_name),
-                                      rand_phone=phone_number(),
-                                      rand_bool=boolean_value(),
-                                      rand_year=year_value(),
-                                      rand_month=month,
-                                      rand_day=day_value(month),
-                                      rand_franchise=rand_franchise(),
-                                      rand_corporation=rand_corporation(),
-                                      date_iso_week=date_iso_7(),
-                                      date_iso_month=date_iso_30(),
-                                      rand_date_1=past_date_slash(_past_date),
-                                      rand_date_2=past_date_hyphen(_past_date),
-                                      rand_date_3=past_date_text(_past_date),
-                                      rand_dob_1=dob_slash(_dob_date),
-                                      rand_dob_2=dob_hyphen(_dob_date),
-                                      rand_dob_3=dob_text(_dob_date),
-                                      rand_image=random_image,
-                                      rand_password=rand_password(),
-                                      )
-    finished = formatted_block.encode('ascii')
-    json_block = json.loads(finished)
-    return json_block
+    return compiled(TemplateContext())
+
+
+def process_template_batch(n: int):
+    batch = BatchContext(n)
+    return [compiled(RowContext(batch, i)) for i in range(n)]
@@ -4,23 +4,24 @@
 import re
 import sys
 import attr
-import json
 import logging
-import time
 import threading
 import concurrent.futures
 import cbcmgr.cli.config as config
 from functools import partial
-from queue import Queue, Empty
-from enum import Enum
+from queue import Queue, Full, Empty
 from typing import Optional
-from datetime import timedelta
 from cbcmgr.cb_bucket import Bucket
 from cbcmgr.cb_index import CBQueryIndex
 from couchbase.management.users import Role
 from cbcmgr.cb_collection import Collection
 from cbcmgr.cli.exceptions import ReplicationError
 from cbcmgr.cb_operation_s import CBOperation
+from cbcmgr.mt_window import TaskWindow
+from cbcmgr.ndjson_reader import NDJSONReader
+import cbcmgr.codec as codec
+from cbcmgr.exceptions import TaskError, StreamWriterError
+from couchbase.exceptions import DocumentExistsException
 
 logger = logging.getLogger('cbutil.replicate')
 logger.addHandler(logging.NullHandler())
@@ -33,33 +34,29 @@ class Output:
     DATA: Optional[dict] = attr.ib(default={})
 
 
-class EnumEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Enum):
-            return obj.value
-        elif isinstance(obj, Collection):
-            # noinspection PyTypeChecker
-            return attr.asdict(obj)
-        elif isinstance(obj, timedelta):
-            return int(obj.total_seconds())
-        return json.JSONEncoder.default(self, obj)
-
-
 class Replicator(object):
 
-    def __init__(self, filters=None, deferred=True):
+    def __init__(self, filters=None, deferred=True, workers=8, data=False, queue_depth=1024):
         self.output = {}
         if filters:
             self.filters = filters
         else:
             self.filters = []
         self.deferred = deferred
+        self.workers = workers
+        self.data = data
+        self.local = threading.local()
+        self.operators = []
+        self.lock = threading.Lock()
+        self.data_stats = dict(documents=0, skipped=0, errors=0)
         self.bucket_filters = []
         self.scope_filters = []
         self.collection_filters = []
         self.user_filters = []
         self.group_filters = []
-        self.q = Queue()
+        self.q = Queue(maxsize=queue_depth)
+        self.stop = threading.Event()
+        self.stream_error = None
 
         self.process_filters()
 
@@ -82,71 +79,94 @@ class Replicator(object):
                 self.group_filters.append(r)
 
     def source(self):
-        writer = threading.Thread(target=self.stream_output_thread)
+        writer = threading.Thread(target=self.stream_output_thread, daemon=True)
         writer.start()
-        self.read_schema_from_db()
-        self.end_stream()
-        writer.join()
+        try:
+            self.read_schema_from_db()
+        except StreamWriterError:
+            pass
+        finally:
+            self.end_stream()
+            writer.join()
+        if self.stream_error:
+            raise ReplicationError(f"output stream failed: {self.stream_error}")
 
     def target(self):
-        reader = threading.Thread(target=self.read_input_thread)
+        reader = threading.Thread(target=self.read_input_thread, daemon=True)
         reader.start()
-        self.read_schema_from_input()
+        try:
+            self.read_schema_from_input()
+        except BaseException:
+            self.stop.set()
+            self.drain_queue()
+            raise
+        finally:
+            self.close_operators()
         reader.join()
 
-    def stream_output_thread(self):
+    def put(self, data: dict):
+        while not self.stop.is_set():
+            try:
+                self.q.put(data, timeout=0.1)
+                return
+            except Full:
+                continue
+        raise StreamWriterError("replication stream stopped")
+
+    def drain_queue(self):
         while True:
             try:
-                entry = self.q.get(block=False)
-                data = json.loads(entry)
+                self.q.get_nowait()
+            except Empty:
+                return
+
+    def stream_output_thread(self):
+        try:
+            while True:
+                data = self.q.get()
                 if data.get('__CMD__') == 'STOP':
                     return
-                print(entry)
-            except Empty:
-                time.sleep(0.1)
-                continue
+                print(codec.dumps(data, indent=not data.get('__DATA__')))
+        except Exception as err:
+            logger.debug(f"output stream error: {type(err).__name__}: {err}")
+            self.stream_error = err
+            self.stop.set()
+            self.drain_queue()
 
     def read_input_thread(self):
-        decoder = json.JSONDecoder()
-        content = sys.stdin
-        buffer = ''
-        for chunk in iter(partial(content.read, 131072), ''):
-            buffer += chunk
-            while buffer:
-                try:
-                    entry, position = decoder.raw_decode(buffer)
-                    self.q.put(json.dumps(entry))
-                    buffer = buffer[position:]
-                    buffer = buffer.lstrip()
-                except ValueError:
-                    break
-        self.end_stream()
+        reader = NDJSONReader(iter(partial(sys.stdin.buffer.read, 131072), b''), batch_size=16)
+        try:
+            for entry in reader:
+                self.put(entry)
+        except StreamWriterError:
+            pass
+        finally:
+            self.end_stream()
 
     def end_stream(self):
-        entry = {'__CMD__': 'STOP'}
-        self.q.put(json.dumps(entry))
+        try:
+            self.put({'__CMD__': 'STOP'})
+        except StreamWriterError:
+            pass
 
     def read_schema_from_db(self):
         operator = CBOperation(config.host, config.username, config.password, ssl=config.tls, project=config.capella_project, database=config.capella_db)
 
-        bucket_list = operator.bucket_list
-        index_list = operator.index_list
+        keyspaces = []
+        snapshot = operator.metadata_snapshot()
+        bucket_list = snapshot.buckets
         user_list = operator.user_list
         group_list = operator.group_list
 
         for group in group_list:
             if any(re.search(rx, group.get('name')) for rx in self.group_filters):
                 continue
-            struct = {'__GROUP__': group}
-            entry = json.dumps(struct, indent=2, cls=EnumEncoder)
-            self.q.put(entry)
+            self.put({'__GROUP__': group})
 
         for user in user_list:
             if any(re.search(rx, user.get('username')) for rx in self.user_filters):
                 continue
-            struct = {'__USER__': user}
-            entry = json.dumps(struct, indent=2, cls=EnumEncoder)
-            self.q.put(entry)
+            self.put({'__USER__': user})
 
         for bucket in bucket_list:
             bucket_index_list = []
@@ -157,12 +177,11 @@ class Replicator(object):
             # noinspection PyTypeChecker
             payload = attr.asdict(bucket_struct)
             struct = {'__BUCKET__': payload}
-            for scope in operator.scope_list(bucket_struct.name):
+            for scope in snapshot.scope_list(bucket_struct.name):
                 if any(re.search(rx, scope.name) for rx in self.scope_filters):
                     continue
                 scope_record = {scope.name: []}
-                collection_list = operator.collection_list(bucket_struct.name, scope.name)
-                for collection in collection_list:
+                for collection in scope.collections:
                     if any(re.search(rx, collection.name) for rx in self.collection_filters):
                         continue
                     scope_record[scope.name].append(
@@ -171,77 +190,176 @@ class Replicator(object):
                             max_ttl=collection.max_ttl
                         )
                     )
+                    keyspaces.append(f"{bucket_struct.name}.{scope.name}.{collection.name}")
                 scope_list.append(scope_record)
             struct.update({'__SCOPE__': scope_list})
-            for index in index_list:
-                if index.keyspace_id == bucket_struct.name or index.bucket_id == bucket_struct.name:
-                    bucket_index_list.append(attr.asdict(index))
+            for index in snapshot.bucket_indexes(bucket_struct.name):
+                bucket_index_list.append(attr.asdict(index))
             struct.update({'__INDEX__': bucket_index_list})
-            entry = json.dumps(struct, indent=2, cls=EnumEncoder)
-            self.q.put(entry)
+            self.put(struct)
+
+        if self.data:
+            self.read_data_from_db(operator, keyspaces)
+
+    def scan_data(self, keyspace: str, collection, start: str, end: str):
+        count = 0
+        batch = {}
+        for doc_id, document in CBOperation.scan_range(collection, start, end):
+            batch[doc_id] = document
+            if len(batch) >= config.batch_size:
+                self.put({'__DATA__': {'keyspace': keyspace, 'documents': batch}})
+                count += len(batch)
+                batch = {}
+        if batch:
+            self.put({'__DATA__': {'keyspace': keyspace, 'documents': batch}})
+            count += len(batch)
+        return count
+
+    def read_data_from_db(self, operator: CBOperation, keyspaces: list):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            tasks = set()
+            for keyspace in keyspaces:
+                collection = operator.connect(keyspace).collection
+                keys = CBOperation.sample_keys(collection, self.workers * 100)
+                for start, end in CBOperation.key_ranges(keys, self.workers):
+                    tasks.add(executor.submit(self.scan_data, keyspace, collection, start, end))
+            count = sum(self.task_wait(tasks))
+        logger.info(f"Streamed {count} document(s) from {len(keyspaces)} keyspace(s)")
+
+    def operator(self) -> CBOperation:
+        if not hasattr(self.local, 'operator'):
+            self.local.operator = CBOperation(config.host, config.username, config.password, create=True, ssl=config.tls, project=config.capella_project, database=config.capella_db)
+            with self.lock:
+                self.operators.append(self.local.operator)
+        return self.local.operator
+
+    def close_operators(self):
+        with self.lock:
+            operators, self.operators = self.operators, []
+        self.local = threading.local()
+        for operator in operators:
+            try:
+                operator.close()
+            except Exception as err:
+                logger.debug(f"close failed: {err}")
+
+    def apply(self, executor: concurrent.futures.Executor, fn, items):
+        tasks = set()
+        for item in items:
+            tasks.add(executor.submit(fn, *item))
+        return self.task_wait(tasks)
+
+    def create_keyspace(self, keyspace: str, bucket: Bucket):
+        logger.info(f"Replicating keyspace {keyspace}")
+        self.operator().connect(keyspace, bucket)
+
+    def create_index(self, index: CBQueryIndex):
+        logger.info(f"Replicating index [{index.keyspace_id}] {index.name}")
+        self.operator().index_create(index, deferred=True)
+
+    def build_indexes(self, bucket: str, scope: str, collection: str, names: list):
+        logger.info(f"Building {len(names)} replicated index(es) on {bucket}.{scope}.{collection}")
+        self.operator().index_build(bucket, scope, collection, names)
+
+    @staticmethod
+    def roles_from_list(role_list: list):
+        roles = []
+        for role in role_list:
+            if role.get('scope') == '*':
+                role['scope'] = None
+            if role.get('collection') == '*':
+                role['collection'] = None
+            roles.append(Role(**role))
+        return roles if len(roles) > 0 else None
+
+    def create_group(self, group: dict):
+        logger.info(f"Creating group {group.get('name')}")
+        self.operator().create_group(group.get('name'), group.get('description'), self.roles_from_list(group.get('roles', [])))
+
+    def create_user(self, user: dict):
+        groups = user.get('groups') or None
+        logger.info(f"Creating user {user.get('username')}")
+        self.operator().create_user(user.get('username'), user.get('name'), user.get('password'), self.roles_from_list(user.get('roles', [])), groups)
+
+    def keyspace_collection(self, keyspace: str):
+        if not hasattr(self.local, 'collections'):
+            self.local.collections = {}
+        if keyspace not in self.local.collections:
+            self.local.collections[keyspace] = self.operator().connect(keyspace).collection
+        return self.local.collections[keyspace]
+
+    def apply_data(self, keyspace: str, documents: dict):
+        result = CBOperation.put_docs(self.keyspace_collection(keyspace), documents, safe=config.safe_mode)
+        skipped = 0
+        for doc_id, err in result.errors.items():
+            if isinstance(err, DocumentExistsException):
+                skipped += 1
+            else:
+                logger.error(f"Document {keyspace}:{doc_id} failed: {err}")
+        with self.lock:
+            self.data_stats['documents'] += len(result.results)
+            self.data_stats['skipped'] += skipped
+            self.data_stats['errors'] += len(result.errors) - skipped
+        return len(result.results)
+
+    def apply_schema(self, executor: concurrent.futures.Executor, schema: dict):
+        keyspaces = {}
+        for (index,) in schema['indexes']:
+            if index.bucket_id:
+                keyspaces.setdefault((index.bucket_id, index.scope_id, index.keyspace_id), []).append(index.name)
+            else:
+                keyspaces.setdefault((index.keyspace_id, "_default", "_default"), []).append(index.name)
+
+        self.apply(executor, self.create_keyspace, schema['buckets'])
+        self.apply(executor, self.create_keyspace, schema['scopes'])
+        self.apply(executor, self.create_keyspace, schema['collections'])
+        self.apply(executor, self.create_index, schema['indexes'])
+        if not self.deferred:
+            self.apply(executor, self.build_indexes, [(*keyspace, names) for keyspace, names in keyspaces.items()])
+        self.apply(executor, self.create_group, schema['groups'])
+        self.apply(executor, self.create_user, schema['users'])
 
     def read_schema_from_input(self):
-        operator = CBOperation(config.host, config.username, config.password, create=True, ssl=config.tls, project=config.capella_project, database=config.capella_db)
-        user_list = []
-        group_list = []
+        schema = dict(buckets=[], scopes=[], collections=[], indexes=[], groups=[], users=[])
+        schema_applied = False
 
-        while True:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
             try:
-                entry = self.q.get(block=False)
-                data = json.loads(entry)
-                if data.get('__CMD__') == 'STOP':
-                    break
-                if data.get('__GROUP__'):
-                    group_list.append(data.get('__GROUP__'))
-                if data.get('__USER__'):
-                    user_list.append(data.get('__USER__'))
-                if data.get('__BUCKET__'):
-                    bucket = Bucket.from_dict(data.get('__BUCKET__'))
-                    if data.get('__SCOPE__'):
-                        scope_list = data.get('__SCOPE__')
-                        for scope_struct in scope_list:
-                            for scope, collections in scope_struct.items():
-                                for collection in collections:
-                                    collection_name = collection.get('name')
-                                    keyspace = f"{bucket.name}.{scope}.{collection_name}"
-                                    logger.info(f"Replicating keyspace {keyspace}")
-                                    operator.connect(keyspace, bucket)
-                    if data.get('__INDEX__'):
-                        index_list = data.get('__INDEX__')
-                        for index in index_list:
-                            entry = CBQueryIndex.from_dict(index)
-                            logger.info(f"Replicating index [{entry.keyspace_id}] {entry.name}")
-                            operator.index_create(entry, deferred=self.deferred)
-            except Empty:
-                time.sleep(0.1)
-                continue
+                with TaskWindow(executor, self.workers * 2) as window:
+                    while True:
+                        data = self.q.get()
+                        if data.get('__CMD__') == 'STOP':
+                            break
+                        if data.get('__GROUP__'):
+                            schema['groups'].append((data.get('__GROUP__'),))
+                        if data.get('__USER__'):
+                            schema['users'].append((data.get('__USER__'),))
+                        if data.get('__BUCKET__'):
+                            bucket = Bucket.from_dict(data.get('__BUCKET__'))
+                            schema['buckets'].append((bucket.name, bucket))
+                            for scope_struct in data.get('__SCOPE__', []):
+                                for scope, collections in scope_struct.items():
+                                    schema['scopes'].append((f"{bucket.name}.{scope}", bucket))
+                                    for collection in collections:
+                                        schema['collections'].append((f"{bucket.name}.{scope}.{collection.get('name')}", bucket))
+                            for index in data.get('__INDEX__', []):
+                                schema['indexes'].append((CBQueryIndex.from_dict(index),))
+                        if data.get('__DATA__'):
+                            if not schema_applied:
+                                self.apply_schema(executor, schema)
+                                schema_applied = True
+                            entry = data.get('__DATA__')
+                            window.submit(self.apply_data, entry.get('keyspace'), entry.get('documents'))
+            except TaskError as err:
+                raise ReplicationError(f"data replication failed: {err}")
 
-        for group in group_list:
-            roles = []
-            for role in group.get('roles', []):
-                if role.get('scope') == '*':
-                    role['scope'] = None
-                if role.get('collection') == '*':
-                    role['collection'] = None
-                r = Role(**role)
-                roles.append(r)
-            logger.info(f"Creating group {group.get('name')}")
-            operator.create_group(group.get('name'), group.get('description'), roles if len(roles) > 0 else None)
+            if not schema_applied:
+                self.apply_schema(executor, schema)
 
-        for user in user_list:
-            roles = []
-            groups = []
-            for role in user.get('roles', []):
-                if role.get('scope') == '*':
-                    role['scope'] = None
-                if role.get('collection') == '*':
-                    role['collection'] = None
-                r = Role(**role)
-                roles.append(r)
-            if user.get('groups'):
-                groups = user.get('groups')
-            logger.info(f"Creating user {user.get('username')}")
-            operator.create_user(user.get('username'), user.get('name'), user.get('password'), roles if len(roles) > 0 else None, groups if len(groups) > 0 else None)
+        if self.data_stats['documents'] or self.data_stats['skipped'] or self.data_stats['errors']:
+            logger.info(f"Replicated {self.data_stats['documents']} document(s), skipped {self.data_stats['skipped']} existing document(s)")
+        if self.data_stats['errors']:
+            raise ReplicationError(f"{self.data_stats['errors']} document(s) failed to replicate")
 
     @staticmethod
     def task_wait(tasks):
@@ -7,16 +7,25 @@ import argparse
 import warnings
 import logging
 import re
+import time
+import asyncio
+from itertools import islice
+from urllib.parse import quote
+from aiohttp import ClientSession, ClientError
 from overrides import override
-from typing import Tuple, List
+from typing import Tuple, List, Iterable, Iterator
 from cbcmgr import VERSION
 from cbcmgr.cli.cli import CLI
 from cbcmgr.cb_connect import CBConnect
 from cbcmgr.cb_management import CBManager
 from cbcmgr.httpsessionmgr import APISession
-from cbcmgr.exceptions import HTTPForbidden, HTTPNotImplemented, PreconditionFailed, ConflictException
+from cbcmgr.exceptions import (HTTPForbidden, HTTPNotImplemented, PreconditionFailed, ConflictException, InternalServerError, SyncGatewayOperationException,
+                               NodeConnectionError)
 from cbcmgr.retry import retry
 from cbcmgr.schema import ProcessSchema, Schema
+from cbcmgr.util import progress_count
+import cbcmgr.codec as codec
+import cbcmgr.http_pool as http_pool
 
 warnings.filterwarnings("ignore")
 logger = logging.getLogger()
@@ -33,7 +42,7 @@ class CBSInterface(object):
 
     def import_schema(self, bucket: str) -> Schema:
         dbm = CBManager(self.host, self.username, self.password, ssl=self.ssl)
-        contents = dbm.cluster_schema_dump()
+        contents = dbm.cluster_schema_dump(refresh=False)
         inventory = ProcessSchema(json_data=contents).inventory()
         return inventory.get(bucket)
 
@@ -46,7 +55,7 @@ class CBSInterface(object):
             dst[key] = src[key]
         return dst
 
-    def keyspace_list(self, keyspace: str) -> Tuple[List[str], dict]:
+    def keyspace_list(self, keyspace: str, db: CBConnect = None) -> Tuple[List[str], dict]:
         collection_list = []
         scope_struct = {}
         elements = keyspace.split('.')
@@ -55,10 +64,14 @@ class CBSInterface(object):
         if len(elements) < 3:
             elements.append(r".*")
 
-        schema = self.import_schema(elements[0])
+        if not db:
+            db = CBManager(self.host, self.username, self.password, ssl=self.ssl)
+        snapshot = db.metadata_snapshot()
 
-        for bucket in schema.buckets:
-            for scope in bucket.scopes:
+        for bucket in snapshot.buckets:
+            if bucket.name != elements[0]:
+                continue
+            for scope in snapshot.scope_list(bucket.name):
                 if not re.match(f"^{elements[1]}$", scope.name) or scope.name == '_default':
                     continue
                 for collection in scope.collections:
@@ -83,29 +96,56 @@ class CBSInterface(object):
 
         return collection_list, scope_struct
 
-    def get_users_by_field(self, field, keyspace):
-        usernames = []
-        collection_list, _ = self.keyspace_list(keyspace)
+    def get_users_by_field(self, field, keyspace, page_size: int = 10000) -> Iterator[str]:
         db = CBConnect(self.host, self.username, self.password, ssl=self.ssl).connect()
+        collection_list, _ = self.keyspace_list(keyspace, db)
+        seen = set()
 
         for collection in collection_list:
-            query = f"select distinct {field} from {collection} where {field} is not missing;"
-            logger.debug(f"get_users_by_field query: {query}")
-            try:
-                results = db.cb_query(sql=query)
+            last = None
+            while True:
+                after = f" and {field} > {codec.dumps(last)}" if last is not None else ""
+                query = f"select distinct raw {field} from {collection} where {field} is not missing{after} order by {field} limit {page_size};"
+                logger.debug(f"get_users_by_field query: {query}")
+                try:
+                    results = db.cb_query(sql=query)
+                except Exception as err:
+                    logger.error(f"Can not get the values for {field}: {err}")
+                    sys.exit(1)
                 if not results:
-                    continue
-                for record in results:
-                    value = record[field]
-                    usernames.append(f"{field}@{value}")
-            except Exception as err:
-                logger.error(f"Can not get the values for {field}: {err}")
-                sys.exit(1)
-
-        return list(set(usernames))
+                    break
+                for value in results:
+                    username = f"{field}@{value}"
+                    if len(collection_list) > 1:
+                        if username in seen:
+                            continue
+                        seen.add(username)
+                    yield username
+                if len(results) < page_size:
+                    break
+                last = results[-1]
+
+
+class RateLimiter(object):
+
+    def __init__(self, rate: float = 0.0):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
 
 
 class SGWDatabase(APISession):
+    poll_interval = 2.0
 
     def __init__(self, node, *args, port=4985, ssl=0, **kwargs):
         super().__init__(*args, **kwargs)
@@ -166,22 +206,30 @@ class SGWDatabase(APISession):
         else:
             return [name]
 
-    def sync_fun(self, name, filename):
-        keyspace_list = self.expand_name(name)
+    async def put_sync_fun_a(self, keyspace_list: List[str], data: str, workers: int):
+        session = self.async_session(workers)
+        tasks = [self.request_a(session, 'PUT', f"/{keyspace}/_config/sync", data=data, content_type='application/javascript') for keyspace in keyspace_list]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def sync_fun(self, name, filename, workers: int = 32):
+        keyspace_list = [keyspace for database in name.split(',') for keyspace in self.expand_name(database)]
 
         with open(filename, "r") as file:
             data = file.read()
-            file.close()
-            for keyspace in keyspace_list:
-                try:
-                    self.api_put_data(f"/{keyspace}/_config/sync", data, 'application/javascript')
-                    logger.info(f"Sync function created for database {keyspace}.")
-                except HTTPForbidden:
-                    logger.error(f"Database {keyspace} does not exist.")
-                    sys.exit(1)
-                except Exception as err:
-                    logger.error(f"Sync function create failed for database {keyspace}: {err}")
-                    sys.exit(1)
+
+        failed = False
+        results = http_pool.run(self.put_sync_fun_a(keyspace_list, data, workers))
+        for keyspace, result in zip(keyspace_list, results):
+            if isinstance(result, HTTPForbidden):
+                logger.error(f"Database {keyspace} does not exist.")
+                failed = True
+            elif isinstance(result, Exception):
+                logger.error(f"Sync function create failed for database {keyspace}: {result}")
+                failed = True
+            else:
+                logger.info(f"Sync function created for database {keyspace}.")
+        if failed:
+            sys.exit(1)
 
     def get_sync_fun(self, name):
         try:
@@ -194,23 +242,59 @@ class SGWDatabase(APISession):
             logger.error(f"Sync function get failed for database {name}: {err}")
             sys.exit(1)
 
-    def resync(self, name):
+    async def resync_db_a(self, session: ClientSession, name: str, stats: dict):
+        await self.request_a(session, 'POST', f"/{name}/_offline")
+        await self.request_a(session, 'POST', f"/{name}/_resync", params={'action': 'start'})
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                status = await self.request_a(session, 'GET', f"/{name}/_resync")
+            except HTTPNotImplemented:
+                break
+            stats[name] = status.get('docs_processed', 0)
+            state = status.get('status')
+            if state == 'completed':
+                break
+            elif state in ('stopped', 'error'):
+                raise SyncGatewayOperationException(f"resync {state}: {status.get('last_error', '')}")
+        await self.request_a(session, 'POST', f"/{name}/_online")
+        logger.info(f"Resync complete for database {name}: {stats[name]} document(s) processed")
+
+    async def resync_a(self, names: List[str], stats: dict):
+        start_time = time.monotonic()
+        session = self.async_session(len(names))
+        reporter = asyncio.create_task(self.resync_progress_a(stats, start_time))
         try:
-            self.api_post(f"/{name}/_offline", None)
-            self.api_post(f"/{name}/_resync", None)
-            logger.info("Waiting for resync to complete")
-            self.resync_wait(name)
-            logger.info("Resync complete")
-        except HTTPForbidden:
-            logger.error(f"Database {name} does not exist.")
-            sys.exit(1)
-        except Exception as err:
-            logger.error(f"Resync failed for database {name}: {err}")
-            sys.exit(1)
+            results = await asyncio.gather(*[self.resync_db_a(session, name, stats) for name in names], return_exceptions=True)
+        finally:
+            reporter.cancel()
+        count = sum(stats.values())
+        progress_count(count, finished=True, ops_per_sec=count / (time.monotonic() - start_time))
+        return results
+
+    @staticmethod
+    async def resync_progress_a(stats: dict, start_time: float):
+        while True:
+            await asyncio.sleep(1)
+            count = sum(stats.values())
+            progress_count(count, ops_per_sec=count / (time.monotonic() - start_time))
 
-    @retry(retry_count=12)
-    def resync_wait(self, name):
-        self.api_post(f"/{name}/_online", None)
+    def resync(self, name):
+        names = name.split(',')
+        stats = dict.fromkeys(names, 0)
+        logger.info("Waiting for resync to complete")
+        results = http_pool.run(self.resync_a(names, stats))
+        failed = False
+        for database, result in zip(names, results):
+            if isinstance(result, HTTPForbidden):
+                logger.error(f"Database {database} does not exist.")
+                failed = True
+            elif isinstance(result, Exception):
+                logger.error(f"Resync failed for database {database}: {result}")
+                failed = True
+        if failed:
+            sys.exit(1)
+        logger.info("Resync complete")
 
     def list(self, name):
         try:
@@ -241,26 +325,94 @@ class SGWDatabase(APISession):
     def ready_wait(self, name):
         self.api_get(f"/{name}/_config").json()
 
-    def dump(self, name):
-        keyspace_list = self.expand_name(name)
+    @retry(retry_count=5, allow_list=(InternalServerError, SyncGatewayOperationException, NodeConnectionError))
+    async def request_a(self, session: ClientSession, method: str, endpoint: str, params: dict = None, data=None, content_type: str = None):
+        headers = {'Content-Type': content_type} if content_type else None
+        try:
+            async with session.request(method, f"{self.url_prefix}{endpoint}", params=params, data=data, headers=headers) as response:
+                self.check_status_code(response.status)
+                body = await response.read()
+                return codec.loads(body) if body else {}
+        except (ClientError, asyncio.TimeoutError) as err:
+            raise NodeConnectionError(f"can not connect to {self.hostname}: {err}")
+
+    async def all_docs_a(self, session: ClientSession, keyspace: str, start_key: str = None, page_size: int = 1000):
+        params = {'limit': page_size}
+        if start_key is not None:
+            params = {'startkey': codec.dumps(start_key), 'limit': page_size + 1}
+        rows = (await self.request_a(session, 'GET', f"/{keyspace}/_all_docs", params)).get('rows', [])
+        more = len(rows) == params['limit']
+        if start_key is not None and rows and rows[0]['id'] == start_key:
+            rows = rows[1:]
+        return rows, more
+
+    async def raw_doc_a(self, session: ClientSession, keyspace: str, item: dict, stats: dict):
+        try:
+            document = await self.request_a(session, 'GET', f"/{keyspace}/_raw/{quote(item['id'], safe='')}")
+        except HTTPNotImplemented:
+            logger.debug(f"Document {item['id']} no longer exists in {keyspace}")
+            return None
+        except Exception as err:
+            logger.error(f"Can not get document {item['id']} from {keyspace}: {err}")
+            stats['errors'] += 1
+            return None
+        try:
+            sequence = document['_sync']['sequence']
+            offset = document['_sync']['recent_sequences'].index(sequence)
+            channels = document['_sync']['history']['channels'][offset]
+        except (KeyError, ValueError, IndexError, TypeError):
+            channels = None
+        return {
+            'keyspace': keyspace,
+            'key': item['key'],
+            'id': item['id'],
+            'rev': item.get('value', {}).get('rev'),
+            'channels': channels
+        }
 
+    async def dump_keyspace_a(self, session: ClientSession, keyspace: str, output, page_size: int, stats: dict):
+        count = 0
+        rows, more = await self.all_docs_a(session, keyspace, page_size=page_size)
+        while rows:
+            next_page = asyncio.create_task(self.all_docs_a(session, keyspace, rows[-1]['id'], page_size)) if more else None
+            records = await asyncio.gather(*[self.raw_doc_a(session, keyspace, item, stats) for item in rows])
+            lines = [codec.dumps(record) for record in records if record]
+            if lines:
+                output.write('\n'.join(lines) + '\n')
+            count += len(lines)
+            rows, more = await next_page if next_page else ([], False)
+        stats['documents'] += count
+        logger.info(f"Keyspace {keyspace}: {count} document(s)")
+
+    async def dump_a(self, keyspace_list: List[str], output, workers: int, page_size: int, stats: dict):
+        session = self.async_session(workers)
         for keyspace in keyspace_list:
-            logger.info(f"Keyspace {keyspace}:")
-            try:
-                response = self.api_get(f"/{keyspace}/_all_docs").json()
-                for item in response["rows"]:
-                    document = self.api_get(f"/{keyspace}/_raw/{item['id']}").json()
-                    sequence = document['_sync']['sequence']
-                    offset = document['_sync']['recent_sequences'].index(sequence)
-                    logger.info(f"Key: {item['key']} "
-                                f"Id: {item['id']} "
-                                f"Channels: {document['_sync']['history']['channels'][offset]}")
-            except HTTPForbidden:
-                logger.error(f"Database {keyspace} does not exist.")
-                sys.exit(1)
-            except Exception as err:
-                logger.error(f"Database list failed for {keyspace}: {err}")
+            await self.dump_keyspace_a(session, keyspace, output, page_size, stats)
+
+    def dump(self, name, output_file=None, workers: int = 32, page_size: int = 1000):
+        keyspace_list = self.expand_name(name)
+        stats = dict(documents=0, errors=0)
+        output = open(output_file, 'w') if output_file else sys.stdout
+
+        try:
+            http_pool.run(self.dump_a(keyspace_list, output, workers, page_size, stats))
+        except HTTPForbidden:
+            logger.error(f"Database {name} does not exist.")
+            sys.exit(1)
+        except Exception as err:
+            logger.error(f"Database dump failed for {name}: {err}")
+            sys.exit(1)
+        finally:
+            if output_file:
+                output.close()
+            else:
+                output.flush()
+
+        if stats['errors']:
+            logger.error(f"{stats['errors']} document(s) could not be read.")
+            if not ignore_errors:
                 sys.exit(1)
+        return stats
 
 
 class SGWUser(APISession):
@@ -294,6 +446,105 @@ class SGWUser(APISession):
             logger.error(f"User create failed for database {dbname}: {err}")
             sys.exit(1)
 
+    def user_url(self, dbname, username):
+        return f"{self.url_prefix}/{dbname}/_user/{quote(username, safe='@')}"
+
+    @retry(retry_count=5, allow_list=(InternalServerError, SyncGatewayOperationException, NodeConnectionError))
+    async def user_exists_a(self, session: ClientSession, dbname, username) -> bool:
+        try:
+            async with session.get(self.user_url(dbname, username)) as response:
+                if response.status == 404:
+                    return False
+                self.check_status_code(response.status)
+                return True
+        except (ClientError, asyncio.TimeoutError) as err:
+            raise NodeConnectionError(f"can not connect to {self.hostname}: {err}")
+
+    @retry(retry_count=5, allow_list=(InternalServerError, SyncGatewayOperationException, NodeConnectionError))
+    async def put_user_a(self, session: ClientSession, dbname, username, data: dict):
+        try:
+            async with session.put(self.user_url(dbname, username), json=data) as response:
+                self.check_status_code(response.status)
+        except (ClientError, asyncio.TimeoutError) as err:
+            raise NodeConnectionError(f"can not connect to {self.hostname}: {err}")
+
+    async def create_user_a(self, session: ClientSession, limiter: RateLimiter, dbname, username, password, stats: dict):
+        data = {
+            "password": password,
+            "admin_channels": [f"channel.{username}"],
+            "disabled": False
+        }
+        await limiter.wait()
+        try:
+            if await self.user_exists_a(session, dbname, username):
+                logger.debug(f"User {username} already exists.")
+                stats['exists'] += 1
+                return
+            await self.put_user_a(session, dbname, username, data)
+            logger.debug(f"User {username} created for database {dbname}.")
+            stats['created'] += 1
+        except ConflictException:
+            logger.debug(f"User {username} already exists.")
+            stats['exists'] += 1
+        except HTTPForbidden:
+            stats['fatal'] = f"Database {dbname} does not exist."
+        except Exception as err:
+            logger.error(f"User {username} create failed for database {dbname}: {err}")
+            stats['errors'] += 1
+
+    async def create_worker_a(self, session: ClientSession, limiter: RateLimiter, q: asyncio.Queue, dbname, password, stats: dict):
+        while True:
+            username = await q.get()
+            if username is None:
+                return
+            if not stats['fatal']:
+                await self.create_user_a(session, limiter, dbname, username, password, stats)
+
+    @staticmethod
+    async def progress_a(stats: dict, start_time: float):
+        while True:
+            await asyncio.sleep(1)
+            count = stats['created'] + stats['exists']
+            progress_count(count, errors=stats['errors'], ops_per_sec=count / (time.monotonic() - start_time), label="Users")
+
+    async def create_bulk_a(self, dbname, usernames: Iterator[str], password, workers: int, rate: float, stats: dict):
+        loop = asyncio.get_running_loop()
+        limiter = RateLimiter(rate)
+        q = asyncio.Queue(maxsize=workers * 2)
+        start_time = time.monotonic()
+        session = self.async_session(workers)
+        tasks = [asyncio.create_task(self.create_worker_a(session, limiter, q, dbname, password, stats)) for _ in range(workers)]
+        reporter = asyncio.create_task(self.progress_a(stats, start_time))
+        try:
+            while not stats['fatal']:
+                block = await loop.run_in_executor(None, lambda: list(islice(usernames, 1000)))
+                if not block:
+                    break
+                for username in block:
+                    await q.put(username)
+            for _ in tasks:
+                await q.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            reporter.cancel()
+            for task in tasks:
+                task.cancel()
+        count = stats['created'] + stats['exists']
+        progress_count(count, finished=True, errors=stats['errors'], ops_per_sec=count / (time.monotonic() - start_time), label="Users")
+
+    def create_bulk(self, dbname, usernames: Iterable[str], password, workers: int = 32, rate: float = 0.0):
+        stats = dict(created=0, exists=0, errors=0, fatal=None)
+        http_pool.run(self.create_bulk_a(dbname, iter(usernames), password, workers, rate, stats))
+        if stats['fatal']:
+            logger.error(stats['fatal'])
+            sys.exit(1)
+        logger.info(f"Created {stats['created']} user(s) for database {dbname}, {stats['exists']} already existed.")
+        if stats['errors']:
+            logger.error(f"{stats['errors']} user(s) could not be created.")
+            if not ignore_errors:
+                sys.exit(1)
+        return stats
+
     def delete(self, name, username):
         try:
             self.api_delete(f"/{name}/_user/{username}")
@@ -396,6 +647,9 @@ class RunMain(CLI):
         opt_parser.add_argument('-P', '--sgpass', action='store', help='SGW user password', default="password")
         opt_parser.add_argument('-F', '--field', action='store', help='Document field')
         opt_parser.add_argument('-a', '--all', action='store_true', help='List all users')
+        opt_parser.add_argument('-w', '--workers', action='store', help='Concurrent requests', type=int, default=32)
+        opt_parser.add_argument('--rate', action='store', help='Maximum requests per second', type=float, default=0.0)
+        opt_parser.add_argument('-o', '--output', action='store', help='Output file')
 
         command_subparser = self.parser.add_subparsers(dest='command')
         command_subparser.add_parser('version', help="Show versions", parents=[opt_parser], add_help=False)
@@ -468,7 +722,7 @@ class RunMain(CLI):
                 if self.options.get:
                     sgdb.get_sync_fun(db_name)
                 else:
-                    sgdb.sync_fun(db_name, sync_function)
+                    sgdb.sync_fun(db_name, sync_function, workers=self.options.workers)
                     sgdb.resync(db_name)
 
             elif self.options.db_command == 'resync':
@@ -481,7 +735,7 @@ class RunMain(CLI):
                     sgdb.list_all()
 
             elif self.options.db_command == "dump":
-                sgdb.dump(db_name)
+                sgdb.dump(db_name, self.options.output, workers=self.options.workers)
 
             elif self.options.db_command == "wait":
                 sgdb.ready_wait(db_name)
@@ -509,9 +763,7 @@ class RunMain(CLI):
                     logger.error(f"User map requires query keyspace parameter (-k)")
                     sys.exit(1)
                 cbdb = CBSInterface(cbs_host, cbs_username, cbs_password)
-                username_list = cbdb.get_users_by_field(field, keyspace)
-                for user in username_list:
-                    sguser.create(db_name, user, sgw_password, channels=f"channel.{user}")
+                sguser.create_bulk(db_name, cbdb.get_users_by_field(field, keyspace), sgw_password, workers=self.options.workers, rate=self.options.rate)
 
         elif self.options.command == 'auth':
             sgauth = SGWAuth(hostname, username, password, ssl=ssl)
@@ -0,0 +1,96 @@
+##
+##
+
+import attr
+import json
+import dataclasses
+from enum import Enum
+from uuid import UUID
+from decimal import Decimal
+from datetime import date, datetime, time, timedelta
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+if orjson:
+    backend = 'orjson'
+elif ujson:
+    backend = 'ujson'
+else:
+    backend = 'json'
+
+JSONDecodeError = ValueError
+
+
+def default(obj):
+    if isinstance(obj, Enum):
+        return obj.value
+    elif isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    elif isinstance(obj, timedelta):
+        return int(obj.total_seconds())
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, UUID):
+        return str(obj)
+    elif isinstance(obj, (set, frozenset)):
+        return list(obj)
+    elif attr.has(type(obj)):
+        # noinspection PyTypeChecker
+        return attr.asdict(obj)
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+
+def encode(obj: Any, indent: bool = False) -> str:
+    if ujson:
+        try:
+            return ujson.dumps(obj, default=default, indent=2 if indent else 0, ensure_ascii=False, escape_forward_slashes=False)
+        except (TypeError, OverflowError):
+            pass
+    if indent:
+        return json.dumps(obj, default=default, indent=2, ensure_ascii=False)
+    return json.dumps(obj, default=default, separators=(',', ':'), ensure_ascii=False)
+
+
+def dumpb(obj: Any, indent: bool = False) -> bytes:
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            pass
+    return encode(obj, indent).encode('utf-8')
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    if orjson:
+        return dumpb(obj, indent).decode('utf-8')
+    return encode(obj, indent)
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    if orjson:
+        return orjson.loads(data)
+    if isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    if ujson:
+        return ujson.loads(data)
+    return json.loads(data)
+
+
+def load(fp) -> Any:
+    return loads(fp.read())
+
+
+def dump(obj: Any, fp, indent: bool = False):
+    fp.write(dumps(obj, indent))
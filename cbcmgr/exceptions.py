@@ -4,7 +4,7 @@
 import os
 import inspect
 import logging
-import json
+import cbcmgr.codec as codec
 
 
 class NonFatalError(Exception):
@@ -34,8 +34,8 @@ class APIException(Exception):
     def __init__(self, message, response, code):
         self.code = code
         try:
-            self.body = json.loads(response)
-        except json.decoder.JSONDecodeError:
+            self.body = codec.loads(response)
+        except codec.JSONDecodeError:
             self.body = {'message': response}
         logger = logging.getLogger(self.__class__.__name__)
         frame = inspect.currentframe().f_back
@@ -354,6 +354,22 @@ class TaskError(CBException):
     pass
 
 
+class StreamShardError(CBException):
+    pass
+
+
+class StreamCheckpointError(CBException):
+    pass
+
+
+class StreamWriterError(CBException):
+    pass
+
+
+class StreamReaderError(CBException):
+    pass
+
+
 class CapellaError(CBException):
     pass
 
@@ -0,0 +1,88 @@
+##
+##
+
+import atexit
+import asyncio
+import hashlib
+import logging
+import threading
+import requests
+from typing import Optional, Tuple
+from requests.adapters import HTTPAdapter, Retry
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+logger = logging.getLogger('cbutil.http.pool')
+logger.addHandler(logging.NullHandler())
+pool_lock = threading.Lock()
+sync_pools = {}
+async_pools = {}
+pool_size = 16
+keepalive_timeout = 30.0
+
+
+def pool_key(url_prefix: str, *credentials) -> Tuple[str, str]:
+    digest = hashlib.sha256('\0'.join(str(c) for c in credentials).encode('utf-8')).hexdigest()
+    return url_prefix, digest
+
+
+def sync_session(key: Tuple[str, str], retries: int = 10, backoff_factor: float = 0.01) -> requests.Session:
+    with pool_lock:
+        session = sync_pools.get(key)
+        if session is None:
+            logger.debug(f"creating connection pool for {key[0]}")
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=Retry(total=retries, backoff_factor=backoff_factor))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            sync_pools[key] = session
+        return session
+
+
+def async_session(key: Tuple[str, str], limit: Optional[int] = None, ssl=False, headers: Optional[dict] = None, auth=None, timeout: Optional[float] = None) -> ClientSession:
+    loop = asyncio.get_running_loop()
+    limit = limit or pool_size
+    with pool_lock:
+        for stale in [k for k in async_pools if k[1].is_closed()]:
+            async_pools.pop(stale).detach()
+        session = async_pools.get((key, loop, limit))
+        if session is None or session.closed:
+            logger.debug(f"creating async connection pool for {key[0]} with limit {limit}")
+            connector = TCPConnector(limit=limit, limit_per_host=limit, keepalive_timeout=keepalive_timeout, ssl=ssl)
+            session = ClientSession(connector=connector, headers=headers, auth=auth, timeout=ClientTimeout(total=timeout))
+            async_pools[(key, loop, limit)] = session
+        return session
+
+
+async def close_async_sessions():
+    loop = asyncio.get_running_loop()
+    with pool_lock:
+        sessions = [s for k, s in async_pools.items() if k[1] is loop]
+        for k in [k for k in async_pools if k[1] is loop]:
+            del async_pools[k]
+    for session in sessions:
+        await session.close()
+
+
+def run(coro):
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_async_sessions()
+    return asyncio.run(runner())
+
+
+@atexit.register
+def close_sessions():
+    with pool_lock:
+        sessions = list(sync_pools.values())
+        sync_pools.clear()
+        pending = [(k[1], s) for k, s in async_pools.items() if not s.closed and not k[1].is_running()]
+        async_pools.clear()
+    for session in sessions:
+        session.close()
+    for loop, session in pending:
+        if loop.is_closed():
+            session.detach()
+        else:
+            loop.run_until_complete(session.close())
@@ -2,7 +2,6 @@
 ##
 
 import requests
-from requests.adapters import HTTPAdapter, Retry
 import json
 import logging
 import base64
@@ -12,8 +11,13 @@ import hmac
 import hashlib
 import warnings
 from enum import Enum
+from typing import Iterator
 from urllib.parse import urlparse
 from requests.auth import AuthBase
+from aiohttp import ClientSession, BasicAuth as AIOBasicAuth
+import cbcmgr.codec as codec
+import cbcmgr.http_pool as http_pool
+from cbcmgr.capella_pager import CapellaPager, page_url, MAX_PAGE_SIZE
 from .exceptions import (NotAuthorized, HTTPForbidden, HTTPNotImplemented, RequestValidationError, InternalServerError, APIError,
                          PaginationDataNotFound, SyncGatewayOperationException, PreconditionFailed, ConflictException, BadRequest)
 
@@ -128,16 +132,15 @@ class APISession(object):
         self.timeout = 60
         self.logger = logging.getLogger(self.__class__.__name__)
         self.url_prefix = "http://127.0.0.1"
-        self.session = requests.Session()
-        retries = Retry(total=10,
-                        backoff_factor=0.01)
-        self.session.mount('http://', HTTPAdapter(max_retries=retries))
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
         self._response = None
+        self._pager = None
+        self._items = None
         if auth_type == AuthType.basic:
             self.auth_class = BasicAuth(self.username, self.password)
+            self.credentials = (self.username, self.password)
         else:
             self.auth_class = CapellaAuth()
+            self.credentials = (self.auth_class.profile_token,)
 
         if "HTTP_DEBUG_LEVEL" in os.environ:
             import http.client as http_client
@@ -159,6 +162,19 @@ class APISession(object):
                 requests_log.setLevel(logging.CRITICAL)
             requests_log.propagate = True
 
+    @property
+    def pool_key(self):
+        return http_pool.pool_key(self.url_prefix, *self.credentials)
+
+    @property
+    def session(self) -> requests.Session:
+        return http_pool.sync_session(self.pool_key)
+
+    def async_session(self, limit: int = None) -> ClientSession:
+        if isinstance(self.auth_class, BasicAuth):
+            return http_pool.async_session(self.pool_key, limit=limit, auth=AIOBasicAuth(self.username, self.password), timeout=self.timeout)
+        return http_pool.async_session(self.pool_key, limit=limit, headers={"Authorization": f"Bearer {self.auth_class.profile_token}"}, timeout=self.timeout)
+
     def check_status_code(self, code):
         self.logger.debug("API status code {}".format(code))
         if code == 200 or code == 201 or code == 202 or code == 204:
@@ -202,10 +218,16 @@ class APISession(object):
 
     @property
     def response(self):
+        if self._pager is not None:
+            return codec.dumps(self.json())
         return self._response
 
     def json(self):
-        return json.loads(self._response)
+        if self._pager is not None:
+            if self._items is None:
+                self._items = list(self._pager.items(self.get_page))
+            return self._items
+        return codec.loads(self._response)
 
     def dump_json(self, indent=2):
         return json.dumps(self.json(), indent=indent)
@@ -219,6 +241,8 @@ class APISession(object):
             raise
 
         self._response = response.text
+        self._pager = None
+        self._items = None
         return self
 
     def http_post(self, endpoint, data=None, headers=None, verify=False):
@@ -230,58 +254,47 @@ class APISession(object):
             raise
 
         self._response = response.text
+        self._pager = None
+        self._items = None
         return self
 
-    @staticmethod
-    def capella_pagination(response_json):
-        if "cursor" in response_json:
-            if "pages" in response_json["cursor"]:
-                data = response_json["data"]
-                if "next" in response_json["cursor"]["pages"]:
-                    next_page = response_json["cursor"]["pages"]["next"]
-                    per_page = response_json["cursor"]["pages"]["perPage"]
-                    return data, next_page, per_page
-                else:
-                    return data, None, None
-        else:
-            raise PaginationDataNotFound("pagination values not found")
+    def get_page(self, url):
+        response = self.session.get(url, auth=self.auth_class, verify=False, timeout=self.timeout)
+        self.check_status_code(response.status_code)
+        return codec.loads(response.content)
 
-    def api_get(self, endpoint, items=None):
-        if items is None:
-            items = []
-        response = self.session.get(self.url_prefix + endpoint, auth=self.auth_class, verify=False, timeout=self.timeout)
+    def api_get(self, endpoint):
+        url = self.url_prefix + endpoint
+        response = self.session.get(url, auth=self.auth_class, verify=False, timeout=self.timeout)
 
         try:
             self.check_status_code(response.status_code)
         except Exception:
             raise
 
+        self._response = response.text
+        self._pager = None
+        self._items = None
         try:
-            response_json = json.loads(response.text)
-            data, next_page, per_page = self.capella_pagination(response_json)
-            items.extend(data)
-            if next_page:
-                ep_path = urlparse(endpoint).path
-                self.api_get(f"{ep_path}?page={next_page}&perPage={per_page}", items)
-            response_text = json.dumps(items)
-        except (PaginationDataNotFound, json.decoder.JSONDecodeError):
-            response_text = response.text
-
-        self._response = response_text
+            self._pager = CapellaPager(url, codec.loads(response.content))
+        except (PaginationDataNotFound, codec.JSONDecodeError):
+            pass
+
         return self
 
+    def items(self) -> Iterator:
+        if self._pager is None:
+            data = self.json()
+            return iter(data if isinstance(data, list) else [data])
+        if self._items is not None:
+            return iter(self._items)
+        return self._pager.items(self.get_page)
+
     def capella_get(self, endpoint):
-        page = 1
-        items = []
-        while True:
-            url = f"{self.url_prefix}{endpoint}?page={page}&perPage=100"
-            response = self.session.get(url, auth=self.auth_class, verify=False, timeout=self.timeout)
-            response_json = json.loads(response.text)
-            items.extend(response_json.get('data'))
-            page = response_json.get('cursor', {}).get('pages', {}).get('next', 0)
-            if page == 0:
-                break
-        return items
+        self.api_get(page_url(endpoint, 1, MAX_PAGE_SIZE))
+        if self._pager is None:
+            return self.json().get('data', [])
+        return self.json()
 
     def api_post(self, endpoint, body):
         response = self.session.post(self.url_prefix + endpoint,
@@ -296,6 +309,8 @@ class APISession(object):
             raise APIError(err, response.text, response.status_code) from err
 
         self._response = response.text
+        self._pager = None
+        self._items = None
         return self
 
     def api_put(self, endpoint, body):
@@ -314,6 +329,8 @@ class APISession(object):
             raise
 
         self._response = response.text
+        self._pager = None
+        self._items = None
         return self
 
     def api_put_data(self, endpoint, body, content_type):
@@ -332,6 +349,8 @@ class APISession(object):
             raise
 
         self._response = response.text
+        self._pager = None
+        self._items = None
         return self
 
     def api_delete(self, endpoint):
@@ -343,6 +362,8 @@ class APISession(object):
             raise
 
         self._response = response.text
+        self._pager = None
+        self._items = None
         return self
 
     def api_patch(self, endpoint, body):
@@ -358,4 +379,6 @@ class APISession(object):
             raise APIError(err, response.text, response.status_code) from err
 
         self._response = response.text
+        self._pager = None
+        self._items = None
         return self
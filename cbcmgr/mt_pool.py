@@ -3,7 +3,12 @@
 
 import concurrent.futures
 import logging
-from cbcmgr.exceptions import TaskError
+import time
+import threading
+import collections
+from typing import Callable, Optional
+from cbcmgr.mt_window import TaskWindow
+from cbcmgr.op_stats import OpStats
 from cbcmgr.cb_session import BucketMode
 from cbcmgr.cb_operation_s import CBOperation, Operation
 
@@ -24,10 +29,22 @@ class CBPool(object):
                  create: bool = False,
                  quota: int = 256,
                  replicas: int = 0,
-                 mode: BucketMode = BucketMode.DEFAULT):
+                 mode: BucketMode = BucketMode.DEFAULT,
+                 batch_size: int = 100,
+                 max_outstanding: int = 1024,
+                 callback: Optional[Callable] = None,
+                 stream: bool = False):
         self.keyspace = {}
-        self.tasks = set()
+        self.batches = {}
         self.executor = concurrent.futures.ThreadPoolExecutor()
+        self.callback = callback
+        self.results = collections.deque() if stream else None
+        self.max_outstanding = max_outstanding
+        self.unread = 0
+        self.closed = False
+        self.lock = threading.Condition()
+        self.window = TaskWindow(self.executor, max_outstanding, callback=self.result_handler if callback or stream else None)
+        self.stats = OpStats()
         self.hostname = hostname
         self.username = username
         self.password = password
@@ -39,6 +56,7 @@ class CBPool(object):
         self.quota = quota
         self.replicas = replicas
         self.mode = mode
+        self.batch_size = batch_size
 
     def connect(self, keyspace):
         if keyspace in self.keyspace:
@@ -55,20 +73,111 @@ class CBPool(object):
                                               mode=self.mode,
                                               create=self.create).connect(keyspace)
 
-    def dispatch(self, keyspace: str, op: Operation, *args):
+    def run(self, operator):
+        start_time = time.perf_counter()
+        try:
+            result = operator.execute()
+        except Exception:
+            self.stats.record(time.perf_counter() - start_time, error=True)
+            raise
+        self.stats.record(time.perf_counter() - start_time)
+        return result
+
+    def result_handler(self, result):
+        if self.callback:
+            self.callback(result)
+        if self.results is not None:
+            with self.lock:
+                self.results.append(result)
+                self.lock.notify_all()
+
+    def dispatch(self, keyspace: str, op: Operation, *args, block: bool = True) -> bool:
         opm = self.keyspace[keyspace]
         operator = opm.get_operator(op)
         operator.prep(*args)
-        self.tasks.add(self.executor.submit(operator.execute))
+        if self.results is None:
+            self.window.submit(self.run, operator)
+            return True
+        if not self.reserve(block):
+            return False
+        try:
+            task = self.window.submit(self.run, operator)
+        except Exception:
+            self.release()
+            raise
+        task.add_done_callback(self.release_failed)
+        return True
+
+    def reserve(self, block: bool = True) -> bool:
+        with self.lock:
+            if block:
+                self.lock.wait_for(lambda: self.unread < self.max_outstanding)
+            elif self.unread >= self.max_outstanding:
+                return False
+            self.unread += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.unread -= 1
+            self.lock.notify_all()
+
+    def release_failed(self, task: concurrent.futures.Future):
+        if task.cancelled() or task.exception():
+            self.release()
+
+    def put(self, keyspace: str, doc_id: str, document):
+        batch = self.batches.setdefault(keyspace, {})
+        batch[doc_id] = document
+        if len(batch) >= self.batch_size:
+            self.flush(keyspace)
+
+    def flush(self, keyspace: str = None, block: bool = True):
+        for name in [keyspace] if keyspace else list(self.batches):
+            batch = self.batches.pop(name, None)
+            if batch and not self.dispatch(name, Operation.WRITE_MULTI, batch, block=block):
+                self.batches[name] = batch
+                return
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+
+    def stream_ready(self, follow: bool = False) -> bool:
+        if self.results or self.window.errors:
+            return True
+        if self.batches and self.unread < self.max_outstanding:
+            return True
+        return not self.unread and (self.closed or not follow)
+
+    def as_completed(self, follow: bool = False):
+        if self.results is None:
+            raise ValueError("pool was not created with stream enabled")
+        while True:
+            self.flush(block=False)
+            with self.lock:
+                self.lock.wait_for(lambda: self.stream_ready(follow))
+                ready = bool(self.results)
+                if ready:
+                    result = self.results.popleft()
+                    self.unread -= 1
+                    self.lock.notify_all()
+                finished = not self.unread and not self.batches and (self.closed or not follow)
+            if ready:
+                yield result
+                continue
+            self.window.check()
+            if finished:
+                break
 
     def join(self):
-        while self.tasks:
-            done, self.tasks = concurrent.futures.wait(self.tasks, return_when=concurrent.futures.FIRST_COMPLETED)
-            for task in done:
-                try:
-                    task.result()
-                except Exception as err:
-                    raise TaskError(err)
+        self.flush(block=self.results is None)
+        try:
+            self.window.join()
+        finally:
+            self.window.errors.clear()
 
     def shutdown(self):
         self.executor.shutdown()
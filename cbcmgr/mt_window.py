@@ -0,0 +1,87 @@
+##
+##
+
+import concurrent.futures
+import threading
+import logging
+from typing import Callable, Optional
+from cbcmgr.exceptions import TaskError
+
+logger = logging.getLogger('cbutil.mt.window')
+logger.addHandler(logging.NullHandler())
+
+
+class TaskWindow(object):
+
+    def __init__(self, executor: concurrent.futures.Executor, max_in_flight: int, keep_results: bool = False, callback: Optional[Callable] = None):
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.keep_results = keep_results
+        self.callback = callback
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Condition()
+        self.tasks = set()
+        self.results = []
+        self.errors = []
+        self.submitted = 0
+        self.completed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.join()
+        else:
+            self.cancel()
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        self.check()
+        self.slots.acquire()
+        try:
+            task = self.executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.tasks.add(task)
+            self.submitted += 1
+        task.add_done_callback(self.complete)
+        return task
+
+    def complete(self, task: concurrent.futures.Future):
+        try:
+            result = task.result()
+            if result:
+                with self.lock:
+                    self.completed += 1
+                    if self.keep_results:
+                        self.results.append(result)
+            if self.callback:
+                self.callback(result)
+        except Exception as err:
+            logger.debug(f"task error: {type(err).__name__}: {err}")
+            with self.lock:
+                self.errors.append(err)
+        finally:
+            with self.lock:
+                self.tasks.discard(task)
+                self.lock.notify_all()
+            self.slots.release()
+
+    def check(self):
+        if self.errors:
+            self.cancel()
+            raise TaskError(f"task failed: {self.errors[0]}")
+
+    def cancel(self):
+        with self.lock:
+            tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+
+    def join(self):
+        with self.lock:
+            self.lock.wait_for(lambda: not self.tasks)
+        self.check()
+        return self.results
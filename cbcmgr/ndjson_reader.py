@@ -0,0 +1,125 @@
+##
+##
+
+import re
+import json
+import codecs
+import logging
+import collections
+import multiprocessing
+import concurrent.futures
+from itertools import chain, islice
+from typing import Iterable, List
+from cbcmgr.codec import loads
+
+logger = logging.getLogger('cbutil.ndjson.reader')
+logger.addHandler(logging.NullHandler())
+whitespace = re.compile(r'\s*')
+
+
+def decode_lines(lines: List[bytes]):
+    objects = []
+    errors = 0
+    for line in lines:
+        try:
+            objects.append(loads(line))
+        except ValueError as err:
+            errors += 1
+            logger.debug(f"can not decode line: {err}")
+    return objects, errors
+
+
+class NDJSONReader(object):
+
+    def __init__(self, chunks: Iterable[bytes], batch_size: int = 1000, workers: int = 0, skip: int = 0, mp_context=None):
+        self.chunks = chunks
+        self.mp_context = mp_context or multiprocessing.get_context('spawn')
+        self.batch_size = batch_size
+        self.workers = workers
+        self.skip = skip
+        self.errors = 0
+        self.count = 0
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def lines(self):
+        pending = b''
+        for chunk in self.chunks:
+            if not chunk:
+                continue
+            lines = (pending + chunk if pending else chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield line
+        if pending.strip():
+            yield pending
+
+    def line_batches(self, lines: Iterable[bytes]):
+        lines = iter(lines)
+        while batch := list(islice(lines, self.batch_size)):
+            yield batch
+
+    def batches(self):
+        lines = islice(self.lines(), self.skip, None)
+        first = next(lines, None)
+        if first is None:
+            return
+        try:
+            loads(first)
+            line_mode = True
+        except ValueError:
+            line_mode = False
+        lines = chain([first], lines)
+
+        if not line_mode:
+            yield from self.stream_batches(lines)
+        elif self.workers > 0:
+            yield from self.parallel_batches(lines)
+        else:
+            for batch in self.line_batches(lines):
+                yield self.collect(*decode_lines(batch))
+
+    def collect(self, objects: list, errors: int):
+        self.count += len(objects)
+        self.errors += errors
+        return objects
+
+    def parallel_batches(self, lines: Iterable[bytes]):
+        pending = collections.deque()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=self.mp_context) as executor:
+            for batch in self.line_batches(lines):
+                pending.append(executor.submit(decode_lines, batch))
+                if len(pending) >= self.workers * 2:
+                    yield self.collect(*pending.popleft().result())
+            while pending:
+                yield self.collect(*pending.popleft().result())
+
+    def stream_batches(self, lines: Iterable[bytes]):
+        decoder = json.JSONDecoder()
+        text = codecs.getincrementaldecoder('utf-8')()
+        buffer = ''
+        batch = []
+        for line in lines:
+            buffer += text.decode(line + b'\n')
+            position = 0
+            while True:
+                position = whitespace.match(buffer, position).end()
+                if position == len(buffer):
+                    break
+                try:
+                    json_object, position = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    break
+                batch.append(json_object)
+                if len(batch) >= self.batch_size:
+                    yield self.collect(batch, 0)
+                    batch = []
+            buffer = buffer[position:]
+        if buffer.strip():
+            self.errors += 1
+            logger.debug(f"incomplete data at end of stream: {len(buffer)} characters")
+        if batch:
+            yield self.collect(batch, 0)
@@ -0,0 +1,91 @@
+##
+##
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger('cbutil.op.stats')
+logger.addHandler(logging.NullHandler())
+
+
+class OpStats(object):
+    buckets = 32
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * self.buckets
+
+    def reset(self):
+        with self.lock:
+            self.start_time = time.monotonic()
+            self.count = 0
+            self.errors = 0
+            self.total_time = 0.0
+            self.max_time = 0.0
+            self.histogram = [0] * self.buckets
+
+    @staticmethod
+    def bucket(latency: float) -> int:
+        return min(int(latency * 1000000).bit_length(), OpStats.buckets - 1)
+
+    def record(self, latency: float, error: bool = False):
+        slot = self.bucket(latency)
+        with self.lock:
+            self.count += 1
+            if error:
+                self.errors += 1
+            self.total_time += latency
+            if latency > self.max_time:
+                self.max_time = latency
+            self.histogram[slot] += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    @property
+    def ops_per_sec(self) -> float:
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total_time / self.count if self.count > 0 else 0.0
+
+    def percentile(self, p: float) -> float:
+        with self.lock:
+            histogram = list(self.histogram)
+            count = self.count
+        if count == 0:
+            return 0.0
+        target = count * p / 100
+        total = 0
+        for slot, n in enumerate(histogram):
+            total += n
+            if total >= target:
+                return min((1 << slot) / 1000000, self.max_time)
+        return self.max_time
+
+    def latency_histogram(self) -> dict:
+        with self.lock:
+            histogram = list(self.histogram)
+        return {f"<{(1 << slot) / 1000:g}ms": n for slot, n in enumerate(histogram) if n > 0}
+
+    def snapshot(self) -> dict:
+        return dict(
+            count=self.count,
+            errors=self.errors,
+            ops_per_sec=self.ops_per_sec,
+            mean=self.mean,
+            max=self.max_time,
+            p50=self.percentile(50),
+            p95=self.percentile(95),
+            p99=self.percentile(99),
+            histogram=self.latency_histogram()
+        )
@@ -3,20 +3,20 @@
 
 import os
 import logging
-import math
-import json
+import cbcmgr.codec as codec
+import cbcmgr.http_pool as http_pool
 import requests
 import warnings
 import base64
 import asyncio
 import ssl
 from typing import Union, List
-from requests.adapters import HTTPAdapter, Retry
 from requests.auth import AuthBase
-from aiohttp import ClientSession, TCPConnector
+from aiohttp import ClientSession
 from cbcmgr.retry import retry
-from cbcmgr.exceptions import NonFatalError
+from cbcmgr.exceptions import NonFatalError, PaginationDataNotFound
 from cbcmgr.cb_capella_config import CapellaConfigFile
+from cbcmgr.capella_pager import CapellaPager, page_cursor, MAX_PAGE_SIZE
 if os.name == 'nt':
     import certifi_win32
     certifi_where = certifi_win32.wincerts.where()
@@ -138,11 +138,6 @@ class RESTManager(object):
             self.hostname = '127.0.0.1'
 
         self.request_headers = self.auth_class.get_header()
-        self.session = requests.Session()
-        retries = Retry(total=10,
-                        backoff_factor=0.01)
-        self.session.mount('http://', HTTPAdapter(max_retries=retries))
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
 
         if not port:
             if use_ssl:
@@ -151,6 +146,14 @@ class RESTManager(object):
                 self.port = 80
 
         self.url_prefix = f"{self.scheme}://{self.hostname}:{self.port}"
+        self.pool_key = http_pool.pool_key(self.url_prefix, *self.request_headers.values())
+
+    @property
+    def session(self) -> requests.Session:
+        return http_pool.sync_session(self.pool_key)
+
+    def async_session(self) -> ClientSession:
+        return http_pool.async_session(self.pool_key, ssl=self.ssl_context if self.verify else False, headers=self.request_headers)
 
     def get(self, url: str):
         response = self.session.get(url, auth=self.auth_class, verify=self.verify)
@@ -182,33 +185,37 @@ class RESTManager(object):
         self.response_code = response.status_code
         return self
 
-    def validate(self):
-        if self.response_code >= 300:
+    @staticmethod
+    def check_response(response_code: int, response_text):
+        if response_code >= 300:
             try:
-                response_json = json.loads(self.response_text)
-                message = f"Can not access Capella API: Response Code: {self.response_code}"
+                response_json = codec.loads(response_text)
+                message = f"Can not access Capella API: Response Code: {response_code}"
                 if 'message' in response_json:
                     message += f" Message: {response_json['message']}"
                 if 'hint' in response_json:
                     message += f" Hint: {response_json['hint']}"
-                if self.response_code == 412:
+                if response_code == 412:
                     raise RetryableError(message)
                 else:
                     raise RuntimeError(message)
-            except json.decoder.JSONDecodeError:
-                raise RuntimeError(f"Invalid response from API endpoint: response code: {self.response_code}")
+            except codec.JSONDecodeError:
+                raise RuntimeError(f"Invalid response from API endpoint: response code: {response_code}")
+
+    def validate(self):
+        self.check_response(self.response_code, self.response_text)
         return self
 
     def json(self):
         try:
-            return json.loads(self.response_text)
-        except json.decoder.JSONDecodeError:
+            return codec.loads(self.response_text)
+        except codec.JSONDecodeError:
             return {}
 
     def as_json(self):
         try:
-            self.response_dict = json.loads(self.response_text)
-        except json.decoder.JSONDecodeError:
+            self.response_dict = codec.loads(self.response_text)
+        except codec.JSONDecodeError:
             self.response_dict = {}
         return self
 
@@ -273,49 +280,39 @@ class RESTManager(object):
     def build_url(self, endpoint: str) -> str:
         return f"{self.url_prefix}{endpoint}"
 
-    @retry()
+    @retry(always_raise_list=(PaginationDataNotFound,))
     async def get_async(self, url: str):
-        conn = TCPConnector(ssl_context=self.ssl_context)
-        async with ClientSession(headers=self.request_headers, connector=conn) as session:
-            async with session.get(url, verify_ssl=self.verify) as response:
-                response = await response.json()
-                return response.get('data', [])
+        async with self.async_session().get(url) as response:
+            body = await response.read()
+            self.check_response(response.status, body)
+            response_json = codec.loads(body)
+            page_cursor(response_json)
+            return response_json
 
     @retry()
     async def get_kv_async(self, url: str, key: str, value: str):
-        conn = TCPConnector(ssl_context=self.ssl_context)
-        async with ClientSession(headers=self.request_headers, connector=conn) as session:
-            async with session.get(url, verify_ssl=self.verify) as response:
-                response = await response.json()
-                return [item for item in response.get('data', []) if item.get(key) == value]
-
-    async def get_capella_a(self, endpoint: str):
-        data = []
-        url = self.page_url(endpoint, 1, 1)
+        warnings.warn("get_kv_async is deprecated, use get_capella_kv", DeprecationWarning, stacklevel=2)
+        async with self.async_session().get(url) as response:
+            body = await response.read()
+            self.check_response(response.status, body)
+            return [item for item in codec.loads(body).get('data', []) if item.get(key) == value]
+
+    def capella_pager(self, endpoint: str) -> CapellaPager:
+        url = self.page_url(endpoint, 1, MAX_PAGE_SIZE)
         logger.debug(f"Capella get {url}")
-        cursor = self.get(url).validate().json()
-
-        total_items = cursor.get('cursor', {}).get('pages', {}).get('totalItems', 1)
-        pages = math.ceil(total_items / 10)
+        response_json = self.get(url).validate().json()
+        response_json.setdefault('data', [])
+        response_json.setdefault('cursor', {'pages': {}})
+        return CapellaPager(self.build_url(endpoint), response_json)
 
-        for result in asyncio.as_completed([self.get_async(self.page_url(endpoint, page, 10)) for page in range(1, pages + 1)]):
-            block = await result
-            data.extend(block)
-
-        self.response_list = data
+    async def get_capella_a(self, endpoint: str):
+        pager = self.capella_pager(endpoint)
+        self.response_list = list(await pager.items_a(self.get_async))
 
     @retry()
     async def get_capella_kv_a(self, endpoint: str, key: str, value: str):
-        data = []
-        url = self.page_url(endpoint, 1, 1)
-        cursor = self.get(url).validate().json()
-
-        total_items = cursor.get('cursor', {}).get('pages', {}).get('totalItems', 1)
-        pages = math.ceil(total_items / 10)
-
-        for result in asyncio.as_completed([self.get_kv_async(self.page_url(endpoint, page, 10), key, value) for page in range(1, pages + 1)]):
-            block = await result
-            data.extend(block)
+        pager = self.capella_pager(endpoint)
+        data = [item for item in await pager.items_a(self.get_async) if item.get(key) == value]
 
         if len(data) == 0:
             raise ValueError('No match')
@@ -2,7 +2,9 @@
 ##
 
 import time
+import random
 import asyncio
+import threading
 import logging
 import traceback
 from typing import Callable
@@ -14,6 +16,46 @@ logger = logging.getLogger('cbutil.retry')
 logger.addHandler(logging.NullHandler())
 
 
+class RetryMetrics(object):
+    fields = ('retries', 'failures', 'deadline_exceeded', 'wait_time')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def add(self, name: str, field: str, value=1):
+        with self.lock:
+            counters = self.counters.setdefault(name, dict.fromkeys(self.fields, 0))
+            counters[field] += value
+
+    def export(self) -> dict:
+        with self.lock:
+            return {name: dict(counters) for name, counters in self.counters.items()}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+
+
+metrics = RetryMetrics()
+
+
+def retry_metrics() -> dict:
+    return metrics.export()
+
+
+def reset_retry_metrics():
+    metrics.reset()
+
+
+def backoff(retry_number: int, factor: float, jitter: float = 0.0) -> float:
+    wait = factor
+    wait *= (2 ** (retry_number + 1))
+    if jitter:
+        wait *= random.uniform(1.0 - jitter, 1.0 + jitter)
+    return wait
+
+
 def retry_inline(func, *args, retry_count=10, factor=0.01, **kwargs):
     for retry_number in range(retry_count + 1):
         try:
@@ -23,66 +65,91 @@ def retry_inline(func, *args, retry_count=10, factor=0.01, **kwargs):
                 logger.debug(f"{func.__name__} retry limit exceeded: {err}")
                 raise
             logger.debug(f"{func.__name__} will retry, number {retry_number + 1}")
-            wait = factor
-            wait *= (2 ** (retry_number + 1))
-            time.sleep(wait)
+            time.sleep(backoff(retry_number, factor))
+
+
+def retry_multi(func, items, *args, retry_count=10, factor=0.01, no_retry_list=None, **kwargs):
+    results = {}
+    errors = {}
+    pending = items
+    for retry_number in range(retry_count + 1):
+        result = func(pending, *args, **kwargs)
+        results.update(result.results)
+        retry_keys = []
+        for key, err in result.exceptions.items():
+            if retry_number == retry_count or not isinstance(err, CouchbaseException) or (no_retry_list and isinstance(err, no_retry_list)):
+                errors[key] = err
+            else:
+                retry_keys.append(key)
+        if not retry_keys:
+            break
+        logger.debug(f"{func.__name__} will retry {len(retry_keys)} key(s), number {retry_number + 1}")
+        pending = {key: items[key] for key in retry_keys} if isinstance(items, dict) else retry_keys
+        time.sleep(backoff(retry_number, factor))
+    return results, errors
 
 
 def retry(retry_count=10,
           factor=0.01,
           allow_list=None,
-          always_raise_list=None
+          always_raise_list=None,
+          jitter=None,
+          deadline=None
           ) -> Callable:
 
     def retry_handler(func):
+        def next_wait(err: Exception, retry_number: int, start_time: float, default_jitter: float):
+            if always_raise_list and isinstance(err, always_raise_list):
+                return None
+
+            if allow_list and not isinstance(err, allow_list):
+                return None
+
+            if retry_number == retry_count:
+                logger.debug(f"{func.__name__} retry limit exceeded")
+                logger.debug(f"Error: {err}")
+                logger.debug(traceback.format_exc())
+                metrics.add(func.__name__, 'failures')
+                return None
+
+            wait = backoff(retry_number, factor, default_jitter if jitter is None else jitter)
+            if deadline is not None and time.monotonic() - start_time + wait > deadline:
+                logger.debug(f"{func.__name__} retry deadline of {deadline}s exceeded")
+                logger.debug(f"Error: {err}")
+                metrics.add(func.__name__, 'deadline_exceeded')
+                return None
+
+            logger.debug(f"{func.__name__} will retry, number {retry_number + 1}")
+            metrics.add(func.__name__, 'retries')
+            metrics.add(func.__name__, 'wait_time', wait)
+            return wait
+
         if not asyncio.iscoroutinefunction(func):
             @wraps(func)
             def f_wrapper(*args, **kwargs):
+                start_time = time.monotonic()
                 for retry_number in range(retry_count + 1):
                     try:
                         return func(*args, **kwargs)
                     except (CouchbaseException, CBException, APIException) as err:
-                        if always_raise_list and isinstance(err, always_raise_list):
-                            raise
-
-                        if allow_list and not isinstance(err, allow_list):
+                        wait = next_wait(err, retry_number, start_time, 0.0)
+                        if wait is None:
                             raise
-
-                        if retry_number == retry_count:
-                            logger.debug(f"{func.__name__} retry limit exceeded")
-                            logger.debug(f"Error: {err}")
-                            logger.debug(traceback.format_exc())
-                            raise
-
-                        logger.debug(f"{func.__name__} will retry, number {retry_number + 1}")
-                        wait = factor
-                        wait *= (2 ** (retry_number + 1))
                         time.sleep(wait)
 
             return f_wrapper
         else:
             @wraps(func)
             async def f_wrapper(*args, **kwargs):
+                start_time = time.monotonic()
                 for retry_number in range(retry_count + 1):
                     try:
                         return await func(*args, **kwargs)
                     except (CouchbaseException, CBException, APIException) as err:
-                        if always_raise_list and isinstance(err, always_raise_list):
-                            raise
-
-                        if allow_list and not isinstance(err, allow_list):
+                        wait = next_wait(err, retry_number, start_time, 0.5)
+                        if wait is None:
                             raise
-
-                        if retry_number == retry_count:
-                            logger.debug(f"{func.__name__} retry limit exceeded")
-                            logger.debug(f"Error: {err}")
-                            logger.debug(traceback.format_exc())
-                            raise
-
-                        logger.debug(f"{func.__name__} will retry, number {retry_number + 1}")
-                        wait = factor
-                        wait *= (2 ** (retry_number + 1))
-                        time.sleep(wait)
+                        await asyncio.sleep(wait)
 
             return f_wrapper
     return retry_handler
@@ -60,8 +60,8 @@ def progress_bar(iteration, total, decimals=1, length=100, fill='#', errors=0, o
         print()
 
 
-def progress_count(count, finished=False, errors=0, ops_per_sec=0.0, end="\r"):
-    print(f'\rProgress: | {count:>20,} Documents | Errors: {errors} Ops/s: {ops_per_sec:.1f}', end=end)
+def progress_count(count, finished=False, errors=0, ops_per_sec=0.0, end="\r", label="Documents"):
+    print(f'\rProgress: | {count:>20,} {label} | Errors: {errors} Ops/s: {ops_per_sec:.1f}', end=end)
     if finished:
         print()
 
@@ -5,7 +5,8 @@ import pytest
 from cbcmgr.cli.randomize import (rand_init, rand_gender, past_date, dob_date, rand_first_name, rand_last_name, month_value, credit_card, social_security_number, four_digits,
                                   zip_code, account_number, dollar_amount, numeric_sequence, hash_code, address_line, rand_city, rand_state, nick_name, email_address, user_name,
                                   phone_number, boolean_value, date_code, year_value, past_date_slash, past_date_hyphen, past_date_text, dob_slash, dob_hyphen, dob_text, day_value,
-                                  rand_franchise, rand_corporation)
+                                  rand_franchise, rand_corporation, prepare_template, process_template, process_template_batch, batch_random,
+                                  UniqueSequence)
 
 warnings.filterwarnings("ignore")
 
@@ -51,3 +52,62 @@ class TestRandomizer(object):
         print("DOB Date 1 : " + dob_slash(_dob_date))
         print("DOB Date 2 : " + dob_hyphen(_dob_date))
         print("DOB Date 3 : " + dob_text(_dob_date))
+
+    def test_2(self):
+        rand_init()
+        prepare_template({
+            "record_id": "record_id",
+            "customer_id": "{{ incr_value }}",
+            "name": "{{ rand_first }} {{ rand_last }}",
+            "first_name": "{{ rand_first }}",
+            "last_name": "{{ rand_last }}",
+            "region": "{{ region_name | upper }}",
+            "verified": True,
+            "history": [{"date": "{{ rand_date_1 }}", "amount": 0.0}]
+        })
+        for n in range(1, 11):
+            document = process_template()
+            assert document['record_id'] == "record_id"
+            assert document['customer_id'] == str(n)
+            assert document['name'] == f"{document['first_name']} {document['last_name']}"
+            assert document['region'] in ("EAST", "CENTRAL", "WEST")
+            assert document['verified'] is True
+            assert len(document['history'][0]['date']) == 10
+            assert document['history'][0]['amount'] == 0.0
+
+    def test_3(self):
+        rand_init()
+        assert all(len(v) == 5 and v.isdigit() for v in batch_random.zip_code(100))
+        assert all(len(v) == 12 for v in batch_random.phone_number(100))
+        assert all(len(v) == 16 for v in batch_random.hash_code(100))
+        assert len(batch_random.rand_first_name(batch_random.rand_gender(100), 100)) == 100
+        prepare_template({
+            "customer_id": "{{ incr_value }}",
+            "name": "{{ rand_first }} {{ rand_last }}",
+            "first_name": "{{ rand_first }}",
+            "last_name": "{{ rand_last }}",
+            "region": "{{ region_name | upper }}",
+            "dob": "{{ rand_dob_1 }}",
+            "day": "{{ rand_day }}"
+        })
+        documents = process_template_batch(1000)
+        assert len(documents) == 1000
+        for n, document in enumerate(documents, start=1):
+            assert document['customer_id'] == str(n)
+            assert document['name'] == f"{document['first_name']} {document['last_name']}"
+            assert document['region'] in ("EAST", "CENTRAL", "WEST")
+            assert len(document['dob']) == 10
+            assert 1 <= int(document['day']) <= 31
+
+    def test_4(self):
+        rand_init()
+        names = [user_name("Test", "User") for _ in range(100)]
+        assert names[0] == "testuser"
+        assert len(set(names)) == 100
+        assert nick_name("Test", "User") == "tuser"
+        assert email_address("Test", "User") == "test.user@example.com"
+        assert email_address("Test", "User") == "test.user1@example.com"
+        sequence = UniqueSequence(10000)
+        assert sorted(sequence.take(10000).tolist()) == list(range(10000))
+        ssn = batch_random.social_security_number(10000) + [social_security_number() for _ in range(1000)]
+        assert len(set(ssn)) == 11000
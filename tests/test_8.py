@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+
+import warnings
+import json
+import uuid
+import threading
+import time
+import asyncio
+import gzip
+import concurrent.futures
+import attr
+import pytest
+from enum import Enum
+from decimal import Decimal
+from datetime import datetime, date, timedelta
+from urllib.parse import urlparse, parse_qsl
+from cbcmgr.mt_window import TaskWindow
+from cbcmgr.ndjson_reader import NDJSONReader
+import cbcmgr.codec as codec
+from cbcmgr.capella_pager import CapellaPager, page_url
+from cbcmgr.cb_connect_lite import BulkResult
+from cbcmgr.cb_stream_export import StreamExport
+from cbcmgr.exceptions import TaskError, PaginationDataNotFound, StreamReaderError
+
+warnings.filterwarnings("ignore")
+
+
+@pytest.mark.serial
+class TestTaskWindow(object):
+
+    def test_1(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def task(n):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return n + 1
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            with TaskWindow(executor, 4) as window:
+                for n in range(64):
+                    window.submit(task, n)
+                    assert len(window.tasks) <= 4
+        assert active[1] <= 4
+        assert window.submitted == 64
+        assert window.completed == 64
+        assert not window.tasks
+
+    def test_2(self):
+        def task(n):
+            if n == 3:
+                raise ValueError("task 3 failed")
+            return n
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            window = TaskWindow(executor, 2)
+            with pytest.raises(TaskError):
+                for n in range(100):
+                    window.submit(task, n)
+                    time.sleep(0.001)
+                window.join()
+            assert isinstance(window.errors[0], ValueError)
+
+    def test_3(self):
+        seen = []
+        values = [0, None, 1, '', 2, {}, [3]]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            with TaskWindow(executor, 2, keep_results=True, callback=seen.append) as window:
+                for value in values:
+                    window.submit(lambda v: v, value)
+        assert window.completed == 3
+        assert sorted(window.results, key=str) == sorted([1, 2, [3]], key=str)
+        assert len(seen) == len(values)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            with TaskWindow(executor, 2) as window:
+                for value in values:
+                    window.submit(lambda v: v, value)
+        assert window.completed == 3
+        assert window.results == []
+
+
+@pytest.mark.serial
+class TestNDJSONReader(object):
+    records = [{"doc_id": f"doc::{n}", "document": {"n": n, "name": "caf\u00e9 \u2603", "tags": ["a", "b"]}} for n in range(100)]
+
+    @staticmethod
+    def split(data: bytes, size: int):
+        return [data[n:n + size] for n in range(0, len(data), size)]
+
+    def test_1(self):
+        data = b''.join(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in self.records)
+        for size in (1, 7, 64, len(data)):
+            reader = NDJSONReader(self.split(data, size), batch_size=16)
+            assert list(reader) == self.records
+            assert reader.count == len(self.records)
+            assert reader.errors == 0
+
+    def test_2(self):
+        data = b''.join(json.dumps(record, indent=2, ensure_ascii=False).encode('utf-8') + b'\n' for record in self.records)
+        for size in (1, 13, len(data)):
+            reader = NDJSONReader(self.split(data, size), batch_size=16)
+            assert list(reader) == self.records
+            assert reader.errors == 0
+
+    def test_3(self):
+        data = b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in self.records[:10])
+        data += b'{"doc_id": "bad"\n' + json.dumps(self.records[10]).encode('utf-8')
+        reader = NDJSONReader(self.split(data, 5), batch_size=4)
+        assert list(reader) == self.records[:11]
+        assert reader.errors == 1
+        reader = NDJSONReader([data], batch_size=4, skip=8)
+        assert list(reader) == self.records[8:11]
+
+
+class Color(Enum):
+    red = 'red'
+
+
+@attr.s
+class Point:
+    x: int = attr.ib(default=1)
+    y: int = attr.ib(default=2)
+
+
+@pytest.mark.serial
+class TestCodec(object):
+    document = {
+        "name": "caf\u00e9 \u2603 a/b \"q\"",
+        "count": 42,
+        "big": 2 ** 60,
+        "ratio": 2.5,
+        "flag": True,
+        "none": None,
+        "list": [1, "two", {"three": 3.0}, [], {}],
+        1: "int key",
+        "created": datetime(2024, 5, 6, 7, 8, 9, 123456),
+        "day": date(2024, 5, 6),
+        "elapsed": timedelta(minutes=2),
+        "price": Decimal("9.75"),
+        "color": Color.red,
+        "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "tags": {"one"},
+        "point": Point(),
+    }
+
+    @staticmethod
+    def backends():
+        names = ['json']
+        if codec.ujson:
+            names.append('ujson')
+        if codec.orjson:
+            names.append('orjson')
+        return names
+
+    @staticmethod
+    def use(monkeypatch, name: str):
+        if name != 'orjson':
+            monkeypatch.setattr(codec, 'orjson', None)
+        if name == 'json':
+            monkeypatch.setattr(codec, 'ujson', None)
+
+    def test_1(self, monkeypatch):
+        output = {}
+        for name in self.backends():
+            with monkeypatch.context() as m:
+                self.use(m, name)
+                output[name] = (codec.dumps(self.document), codec.dumps(self.document, indent=True), codec.dumpb(self.document))
+        expected = output.pop('json')
+        for name, result in output.items():
+            assert result == expected, name
+        assert '\u00e9' in json.loads(expected[0])["name"]
+        assert expected[2] == expected[0].encode('utf-8')
+        assert json.loads(expected[1]) == json.loads(expected[0])
+
+    def test_2(self, monkeypatch):
+        text = json.dumps({"name": "caf\u00e9", "values": [1, 2.5, None]})
+        for name in self.backends():
+            with monkeypatch.context() as m:
+                self.use(m, name)
+                for data in (text, text.encode('utf-8'), bytearray(text.encode('utf-8')), memoryview(text.encode('utf-8'))):
+                    assert codec.loads(data) == json.loads(text), name
+                with pytest.raises(codec.JSONDecodeError):
+                    codec.loads(b'{"name": ')
+
+
+@pytest.mark.serial
+class TestCapellaPager(object):
+    url = "https://cloud.example.com/v4/organizations/org/projects"
+    items = [{"id": n} for n in range(257)]
+
+    def get(self, url: str):
+        query = dict(parse_qsl(urlparse(url).query))
+        page, per_page = int(query.get('page', 1)), int(query.get('perPage', 100))
+        data = self.items[(page - 1) * per_page:page * per_page]
+        pages = {"page": page, "perPage": per_page, "totalItems": len(self.items), "last": -(-len(self.items) // per_page)}
+        if page * per_page < len(self.items):
+            pages["next"] = page + 1
+        return {"data": data, "cursor": {"pages": pages}}
+
+    def test_1(self):
+        requested = []
+
+        def get(url):
+            requested.append(url)
+            return self.get(url)
+
+        pager = CapellaPager(self.url, self.get(page_url(self.url, 1, 100)))
+        assert pager.pages == [2, 3]
+        assert list(pager.items(get)) == self.items
+        assert list(pager.items(get)) == self.items
+        assert sorted(requested) == sorted([page_url(self.url, page, 100) for page in (2, 3)] * 2)
+
+    def test_2(self):
+        pager = CapellaPager(self.url, self.get(page_url(self.url, 1, 10)))
+        assert pager.first == []
+        assert pager.per_page == 100
+        assert pager.pages == [1, 2, 3]
+        assert list(pager.items(self.get)) == self.items
+
+    def test_3(self):
+        async def get(url):
+            await asyncio.sleep(0)
+            return self.get(url)
+
+        pager = CapellaPager(self.url, self.get(page_url(self.url, 1, 100)))
+        assert list(asyncio.run(pager.items_a(get))) == self.items
+
+    def test_4(self):
+        pager = CapellaPager(self.url, {"data": self.items[:5], "cursor": {"pages": {"page": 1, "perPage": 100, "totalItems": 5}}})
+        assert pager.pages == []
+        assert list(pager.items(self.get)) == self.items[:5]
+        with pytest.raises(PaginationDataNotFound):
+            CapellaPager(self.url, {"data": []})
+        with pytest.raises(PaginationDataNotFound):
+            CapellaPager(self.url, {"data": [], "cursor": {"pages": {"next": 2}}})
+        assert dict(parse_qsl(urlparse(page_url(self.url + "?filter=x&page=9", 2, 50)).query)) == {"filter": "x", "page": "2", "perPage": "50"}
+
+
+class Crash(Exception):
+    pass
+
+
+class LocalStream(StreamExport):
+
+    def __init__(self, file_name: str, documents: dict, resume: bool = False, fail_after: int = 0):
+        self.documents = documents
+        self.stored = {}
+        self.puts = 0
+        self.fail_after = fail_after
+        self.calls = 0
+        super().__init__("127.0.0.1", "Administrator", "password",
+                         keyspace="test.test.test",
+                         file_name=file_name,
+                         block_size=256,
+                         max_in_flight=1,
+                         quiet=True,
+                         resume=resume,
+                         checkpoint_interval=1e-9)
+        self.batch_size = 10
+
+    def is_reachable(self):
+        pass
+
+    def check_cluster(self):
+        pass
+
+    def session(self):
+        return None
+
+    def connect(self, keyspace: str, bucket_struct=None):
+        return self
+
+    def ordered_doc_list(self, after: str = None):
+        for doc_id in sorted(self.documents):
+            if after is None or doc_id > after:
+                yield doc_id
+
+    def get_multi(self, doc_ids):
+        self.calls += 1
+        if self.fail_after and self.calls > self.fail_after:
+            raise Crash("source failed")
+        return BulkResult(results={doc_id: self.documents[doc_id] for doc_id in doc_ids})
+
+    def put_multi(self, documents: dict):
+        self.puts += len(documents)
+        self.stored.update(documents)
+        return BulkResult(results=dict(documents))
+
+    def checkpoint_in(self, records: int, complete: bool = False):
+        super().checkpoint_in(records, complete)
+        self.calls += 1
+        if self.fail_after and self.calls >= self.fail_after:
+            raise Crash("target failed")
+
+
+@pytest.mark.serial
+class TestStreamExport(object):
+    documents = {f"doc::{n:04d}": {"n": n, "name": f"name {n}"} for n in range(500)}
+
+    @staticmethod
+    def read_file(file_name: str):
+        with gzip.open(file_name, 'rb') as input_file:
+            return [json.loads(line) for line in input_file]
+
+    @staticmethod
+    def checkpoint(file_name: str):
+        with open(f"{file_name}.checkpoint", 'r') as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def test_1(self, tmp_path):
+        file_name = str(tmp_path / "export.ndjson.gz")
+        with pytest.raises(Crash):
+            LocalStream(file_name, self.documents, fail_after=20).stream_out()
+        state = self.checkpoint(file_name)
+        assert state["mode"] == "out"
+        assert state["complete"] is False
+        assert state["records"] == 200
+        assert state["last_key"] == "doc::0199"
+        assert state["offset"] == len(open(file_name, 'rb').read())
+
+        with open(file_name, 'ab') as zip_file:
+            zip_file.write(b'\x1f\x8b\x08 torn write')
+        export = LocalStream(file_name, self.documents, resume=True)
+        assert export.stream_out() == 300
+        records = self.read_file(file_name)
+        assert [record["doc_id"] for record in records] == sorted(self.documents)
+        assert all(record["document"] == self.documents[record["doc_id"]] for record in records)
+        state = self.checkpoint(file_name)
+        assert state["complete"] is True
+        assert state["records"] == 500
+        assert LocalStream(file_name, self.documents, resume=True).stream_out() == 0
+
+    def test_2(self, tmp_path):
+        file_name = str(tmp_path / "import.ndjson.gz")
+        LocalStream(file_name, self.documents).stream_out()
+
+        first = LocalStream(file_name, {}, fail_after=20)
+        with pytest.raises(Crash):
+            first.stream_in()
+        state = self.checkpoint(file_name)
+        assert state["mode"] == "in"
+        assert state["complete"] is False
+        assert 0 < state["member_records"] <= state["records"] < 500
+        assert len(first.stored) == state["records"]
+
+        second = LocalStream(file_name, {}, resume=True)
+        assert second.stream_in() == 500 - state["records"]
+        assert second.puts == 500 - state["records"]
+        assert {**first.stored, **second.stored} == self.documents
+        assert self.checkpoint(file_name)["complete"] is True
+        assert LocalStream(file_name, {}, resume=True).stream_in() == 0
+
+    def test_3(self, tmp_path):
+        file_name = str(tmp_path / "truncated.ndjson.gz")
+        LocalStream(file_name, self.documents).stream_out()
+        data = open(file_name, 'rb').read()
+        with open(file_name, 'wb') as zip_file:
+            zip_file.write(data[:-10])
+        export = LocalStream(file_name, {})
+        with pytest.raises(StreamReaderError):
+            export.stream_in()
+        assert self.checkpoint(file_name)["complete"] is False
+
+        with open(file_name, 'wb') as zip_file:
+            zip_file.write(data)
+        resumed = LocalStream(file_name, {}, resume=True)
+        resumed.stream_in()
+        assert {**export.stored, **resumed.stored} == self.documents
+        assert self.checkpoint(file_name)["complete"] is True